@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+from bs4 import BeautifulSoup
+
+import FitnessFunctionScraper
+import ParetoRanking
+import RandomGenerator
+import ResultTableParser
+from EvaluationEngine import EvaluationEngine
+from PeptideEvolutionNSGAII import NSGA_II
+from Population import decode_sequences
+from StubPredictorServer import StubPredictorServer, render_camp_page, render_toxinpred_page
+from Surrogate import SurrogateModel
+
+
+def random_peptide_strings(count, lowerRange=8, upperRange=19, seed=0):
+    sequences, _ = RandomGenerator.generate_random_sequences(lowerRange, upperRange, count, np.random.default_rng(seed))
+    return decode_sequences(sequences)
+
+
+def benchmark_evaluation_engine(num_peptides=70, latency=0.2, repeats=5):
+    """Compare sequential predictor calls with the concurrent EvaluationEngine.
+
+    Both variants run against a local StubPredictorServer whose responses are
+    delayed by `latency` seconds.
+    """
+    peptide_strings = random_peptide_strings(num_peptides)
+
+    with StubPredictorServer(latency=latency) as server:
+        start = time.perf_counter()
+        for _ in range(repeats):
+            FitnessFunctionScraper.scrape_fitness_function(peptide_strings, url=server.camp_url)
+            FitnessFunctionScraper.toxicity(peptide_strings, url=server.toxinpred_url)
+        sequential = (time.perf_counter() - start) / repeats
+
+        engine = EvaluationEngine(camp_url=server.camp_url, toxinpred_url=server.toxinpred_url)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            engine.evaluate(peptide_strings)
+        concurrent = (time.perf_counter() - start) / repeats
+        engine.close()
+
+    print('Evaluation of {} peptides, {:.0f} ms latency per response'.format(num_peptides, latency * 1000))
+    print('  sequential: {:8.1f} ms'.format(sequential * 1000))
+    print('  concurrent: {:8.1f} ms ({:.2f}x)'.format(concurrent * 1000, sequential / concurrent))
+
+
+def legacy_non_dominated_sort(objectives):
+    """Pairwise Python loop formerly used by NSGA_II.perform_non_dominated_sort."""
+    list_of_dominated_indices = [[] for _ in objectives]
+    domination_count = np.zeros(len(objectives))
+    pareto_fronts = [[]]
+
+    for i, _ in enumerate(objectives):
+        for j, _ in enumerate(objectives):
+            if i == j:
+                continue
+            amp_prob_diff = np.sign(objectives[i][0] - objectives[j][0])
+            toxicity_diff = np.sign(objectives[i][1] - objectives[j][1])
+            if (amp_prob_diff > 0 and toxicity_diff >= 0) or (amp_prob_diff >= 0 and toxicity_diff > 0):
+                list_of_dominated_indices[i].append(j)
+            elif amp_prob_diff < 0 and toxicity_diff < 0:
+                domination_count[i] += 1
+        if domination_count[i] == 0:
+            pareto_fronts[0].append(i)
+
+    i = 0
+    while len(pareto_fronts[i]) > 0:
+        next_pareto_front = []
+        for j in pareto_fronts[i]:
+            for k in list_of_dominated_indices[j]:
+                domination_count[k] -= 1
+                if domination_count[k] == 0:
+                    next_pareto_front.append(k)
+        i += 1
+        pareto_fronts.append(next_pareto_front)
+
+    del pareto_fronts[-1]
+    return pareto_fronts
+
+
+def benchmark_non_dominated_sort(sizes=(100, 1000, 2000, 10000, 100000), max_legacy_size=1000, max_matrix_size=10000):
+    """Time the legacy loop, the domination matrix and non_dominated_sort on growing populations.
+
+    Objectives are rounded to two decimals like the predictor outputs, so the
+    populations contain ties: non_dominated_sort uses the domination matrix
+    below ParetoRanking.TIED_SWEEP_MIN_SIZE solutions and the tie-aware sweep
+    from there on.
+    The matrix needs n * n memory and the legacy loop O(n^2) interpreter
+    steps, so both are skipped for the largest sizes.
+    """
+    rng = np.random.default_rng(0)
+
+    # The first np.unique call pays a one-time setup cost; keep it out of the smallest size.
+    ParetoRanking.non_dominated_sort(np.zeros((2, 2)))
+
+    print('Non-dominated sort (ms)')
+    print('  {:>8} {:>10} {:>10} {:>10}'.format('n', 'legacy', 'matrix', 'sorted'))
+
+    for size in sizes:
+        objectives = np.round(rng.random((size, 2)), 2)
+        timings = {}
+
+        if size <= max_legacy_size:
+            start = time.perf_counter()
+            legacy_fronts = legacy_non_dominated_sort(objectives)
+            timings['legacy'] = time.perf_counter() - start
+
+        if size <= max_matrix_size:
+            start = time.perf_counter()
+            matrix_fronts, _ = ParetoRanking.matrix_non_dominated_sort(objectives)
+            timings['matrix'] = time.perf_counter() - start
+
+            if size <= max_legacy_size:
+                assert [sorted(front) for front in legacy_fronts] == [sorted(front.tolist()) for front in matrix_fronts]
+
+        start = time.perf_counter()
+        fronts, _ = ParetoRanking.non_dominated_sort(objectives)
+        timings['sorted'] = time.perf_counter() - start
+
+        if size <= max_matrix_size:
+            assert [front.tolist() for front in matrix_fronts] == [front.tolist() for front in fronts]
+
+        print('  {:>8} {:>10} {:>10} {:>10}'.format(size, *(
+            '{:.1f}'.format(timings[name] * 1000) if name in timings else '-'
+            for name in ('legacy', 'matrix', 'sorted'))))
+
+
+def benchmark_surrogate(num_generations=30, population_size=50, offspring_size=20, oversampling=4, seeds=(0, 1, 2)):
+    """Compare remote evaluations needed to reach the same front quality with and without the surrogate.
+
+    Runs NSGA_II against a local StubPredictorServer and records, after every
+    generation, the number of peptides submitted to the predictors and the
+    hypervolume of the best front found so far. The target quality is the
+    final hypervolume reached without the surrogate.
+    """
+    def run(server, seed, surrogate):
+        engine = EvaluationEngine(camp_url=server.camp_url, toxinpred_url=server.toxinpred_url)
+        GA = NSGA_II(8, 19, population_size, offspring_size, num_generations, 5, 0.3, 0.7,
+                     evaluator=engine, seed=seed, surrogate=surrogate, surrogate_oversampling=oversampling)
+        history = []
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            population = GA.initialize_population()
+            for _ in range(num_generations):
+                population = GA.evolve_generation(population)
+                history.append((GA.evaluation_counts['submitted'], GA.pareto_archive.hypervolume))
+
+        engine.close()
+        return history
+
+    def evaluations_to_reach(history, target):
+        return next((submitted for submitted, hypervolume in history if hypervolume >= target), None)
+
+    print('Surrogate pre-screening ({}x oversampling, {} children per generation)'.format(oversampling, offspring_size))
+
+    with StubPredictorServer() as server:
+        for seed in seeds:
+            baseline = run(server, seed, None)
+            screened = run(server, seed, SurrogateModel())
+            target = baseline[-1][1]
+            baseline_cost = evaluations_to_reach(baseline, target)
+            screened_cost = evaluations_to_reach(screened, target)
+
+            print('  seed {}: target hypervolume {:.3f}, remote evaluations {} without surrogate, {} with ({})'.format(
+                seed, target, baseline_cost,
+                screened_cost if screened_cost is not None else 'not reached',
+                '{:.2f}x fewer'.format(baseline_cost / screened_cost) if screened_cost else '-'))
+
+
+def legacy_camp_rows(html):
+    """Parse a CAMP result page the way scrape_fitness_function originally did, with BeautifulSoup."""
+    soup = BeautifulSoup(html, 'html.parser')
+    rows = soup.find('table', attrs={'border': '1'}).find_all('tr')
+    return [(row.find_all('td')[0].text, row.find_all('td')[2].text) for row in rows[1:]]
+
+
+def legacy_toxinpred_rows(html):
+    """Parse a ToxinPred result page the way toxicity originally did, with BeautifulSoup."""
+    soup = BeautifulSoup(html, 'html.parser')
+    rows = soup.find('table', {'id': 'tableTwo'}).find('tbody').find_all('tr')
+    return [tuple(row.find_all('td')[column].text for column in (0, 2, 3)) for row in rows]
+
+
+def benchmark_html_parsing(sizes=(10, 100, 1000, 10000), repeats=3):
+    """Compare BeautifulSoup parsing of result pages with the streaming ResultTableParser.
+
+    Pages are rendered once per size by the StubPredictorServer, in the
+    shape of saved CAMP and ToxinPred responses, and then parsed repeatedly.
+    """
+    print('Result page parsing (ms per page)')
+    print('  {:>8} {:>12} {:>12} {:>15} {:>15}'.format(
+        'rows', 'camp bs4', 'camp stream', 'toxinpred bs4', 'toxinpred stream'))
+
+    for size in sizes:
+        records = [(peptide_string, peptide_string) for peptide_string in random_peptide_strings(size)]
+        pages = {'camp': render_camp_page(records), 'toxinpred': render_toxinpred_page(records)}
+        parsers = [
+            ('camp', legacy_camp_rows), ('camp', ResultTableParser.camp_rows),
+            ('toxinpred', legacy_toxinpred_rows), ('toxinpred', ResultTableParser.toxinpred_rows),
+        ]
+        timings = []
+        results = []
+
+        for page, parse in parsers:
+            start = time.perf_counter()
+            for _ in range(repeats):
+                rows = parse(pages[page])
+            timings.append((time.perf_counter() - start) / repeats)
+            results.append(rows)
+
+        assert results[0] == results[1] and results[2] == results[3]
+
+        print('  {:>8} {:>12.1f} {:>12.1f} {:>15.1f} {:>15.1f}'.format(size, *(timing * 1000 for timing in timings)))
+
+
+# Entry points started by batch workers and sweep shards.
+STARTUP_MODULES = ('main', 'PeptideEvolutionNSGAII', 'FitnessFunctionScraper', 'EvaluationDaemon', 'ParameterSweep')
+
+# Packages too slow to import at startup; they may only be imported where they are used.
+HEAVY_MODULES = ('bs4', 'matplotlib', 'pandas', 'scipy')
+
+IMPORT_PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import {module}
+print(json.dumps([time.perf_counter() - start, [name for name in {heavy_modules!r} if name in sys.modules]]))
+'''
+
+
+def benchmark_import_time(modules=STARTUP_MODULES, repeats=5):
+    """Time importing the entry points, each in a fresh interpreter.
+
+    Fails if an entry point loads one of HEAVY_MODULES, so startup
+    regressions are caught before they reach the batch workers.
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+
+    print('Import time (median of {} fresh interpreters)'.format(repeats))
+
+    for module in modules:
+        probe = IMPORT_PROBE.format(module=module, heavy_modules=HEAVY_MODULES)
+        timings = []
+
+        for _ in range(repeats):
+            output = subprocess.run([sys.executable, '-c', probe], cwd=directory, check=True,
+                                    capture_output=True, text=True).stdout
+            seconds, heavy_modules = json.loads(output.splitlines()[-1])
+            timings.append(seconds)
+
+        print('  {:<25} {:8.1f} ms'.format(module, statistics.median(timings) * 1000))
+        assert not heavy_modules, '{} imports {} at startup'.format(module, ', '.join(heavy_modules))
+
+
+BENCHMARKS = {
+    'evaluation': benchmark_evaluation_engine,
+    'html_parsing': benchmark_html_parsing,
+    'import_time': benchmark_import_time,
+    'non_dominated_sort': benchmark_non_dominated_sort,
+    'surrogate': benchmark_surrogate,
+}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run performance benchmarks.')
+    parser.add_argument('benchmarks', nargs='*', help='Benchmarks to run (default: all): {}.'.format(
+        ', '.join(sorted(BENCHMARKS))))
+    arguments = parser.parse_args()
+
+    for name in arguments.benchmarks:
+        if name not in BENCHMARKS:
+            parser.error('unknown benchmark: {}'.format(name))
+
+    for name in arguments.benchmarks or sorted(BENCHMARKS):
+        BENCHMARKS[name]()
@@ -0,0 +1,133 @@
+import json
+import os
+
+import numpy as np
+
+import FitnessFunctionScraper
+from Population import Population
+
+
+def save_checkpoint(path, nsga, population, generation_number):
+    """Write a snapshot of a running NSGA_II to a compressed .npz file.
+
+    The snapshot holds the population columns, the random number generator
+    state, the run counters, the Pareto archive and, when the fitness cache
+    has no file of its own, all cached predictor results. It is written to
+    a temporary file which then atomically replaces path, so a crash while
+    writing never leaves a broken checkpoint behind.
+
+    Parameters
+    ----------
+    path : string
+        Path of the checkpoint file.
+    nsga : NSGA_II
+        The running algorithm.
+    population : Population
+        Ranked population after generation_number generations.
+    generation_number : int
+        Number of completed generations, 0 for the initial population.
+    """
+    archive = nsga.pareto_archive.front()
+
+    state = {
+        'generation_number': generation_number,
+        'rng_state': nsga.rng.bit_generator.state,
+        'mutation_counts': dict(nsga.mutation_counts),
+        'evaluation_counts': dict(nsga.evaluation_counts),
+        'hypervolume_history': nsga.hypervolume_history,
+        'cache_entries': _cache_entries(nsga),
+    }
+
+    _write_snapshot(
+        path,
+        sequences=population.sequences,
+        lengths=population.lengths,
+        ff_amp_probability=population.ff_amp_probability,
+        ff_toxicity=population.ff_toxicity,
+        rank=population.rank,
+        distance=population.distance,
+        archive_peptides=np.array([peptide_string for peptide_string, _, _ in archive], dtype=str),
+        archive_objectives=nsga.pareto_archive.objectives(),
+        state=np.array(json.dumps(state))
+    )
+
+
+def save_cache_entries(path, nsga):
+    """Store the current in-memory fitness cache of nsga in an existing checkpoint.
+
+    Everything else in the snapshot is kept, so a run which failed during a
+    generation resumes from the last completed one, but without submitting
+    the peptides which were scored before the failure again.
+
+    Parameters
+    ----------
+    path : string
+        Path of a checkpoint written by save_checkpoint.
+    nsga : NSGA_II
+        The failed algorithm.
+    """
+    if nsga.fitness_cache.path is not None:
+        return
+
+    with np.load(path) as snapshot:
+        arrays = {name: snapshot[name] for name in snapshot.files}
+
+    state = json.loads(str(arrays['state']))
+    state['cache_entries'] = _cache_entries(nsga)
+    arrays['state'] = np.array(json.dumps(state))
+
+    _write_snapshot(path, **arrays)
+
+
+def _cache_entries(nsga):
+    cache_entries = {}
+
+    if nsga.fitness_cache.path is None:
+        # An on-disk cache already survives the crash, an in-memory one has to be saved.
+        for predictor_key in (FitnessFunctionScraper.camp_predictor_key(),
+                              FitnessFunctionScraper.toxinpred_predictor_key()):
+            cache_entries[predictor_key] = nsga.fitness_cache.items(predictor_key)
+
+    return cache_entries
+
+
+def _write_snapshot(path, **arrays):
+    # Write to a temporary file which then atomically replaces path.
+    temporary_path = path + '.tmp'
+
+    with open(temporary_path, 'wb') as file:
+        np.savez_compressed(file, **arrays)
+        file.flush()
+        os.fsync(file.fileno())
+
+    os.replace(temporary_path, path)
+
+
+def load_checkpoint(path):
+    """Read a snapshot written by save_checkpoint.
+
+    Returns
+    -------
+    Tuple (population, archive, state).
+        population is the saved Population, archive a list of
+        (peptide_string, ff_amp_probability, ff_toxicity) tuples and state
+        a dictionary with generation_number, rng_state, mutation_counts,
+        evaluation_counts, hypervolume_history and cache_entries.
+    """
+    with np.load(path) as snapshot:
+        population = Population(
+            snapshot['sequences'],
+            snapshot['lengths'],
+            snapshot['ff_amp_probability'],
+            snapshot['ff_toxicity'],
+            snapshot['rank'],
+            snapshot['distance']
+        )
+        archive = [
+            (str(peptide_string), float(ff_amp_probability), float(ff_toxicity))
+            for peptide_string, (ff_amp_probability, ff_toxicity)
+            in zip(snapshot['archive_peptides'], snapshot['archive_objectives'])
+        ]
+        state = json.loads(str(snapshot['state']))
+
+    return population, archive, state
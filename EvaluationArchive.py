@@ -0,0 +1,234 @@
+import csv
+import os
+import threading
+
+import numpy as np
+
+from Population import CODE_TO_BYTE, encode_sequences
+from Surrogate import load_legacy_results
+
+# Column files of an archive directory and their dtypes. Every column has
+# one value per evaluated peptide, except residues, which holds the amino
+# acid codes of all peptides back to back (see Population.encode_sequences).
+COLUMNS = {
+    'lengths': np.int32,
+    'ff_amp_probability': np.float64,
+    'ff_toxicity': np.float64,
+    'generation': np.int32,
+    'run_id': np.int32,
+}
+RESIDUES = 'residues'
+
+EXPORT_COLUMNS = ('peptide', 'ff_amp_probability', 'ff_toxicity', 'generation', 'run_id')
+
+
+class EvaluationArchive:
+    """Append-only columnar store of evaluated peptides.
+
+    The archive is a directory with one raw binary file per column, so
+    reading it means memory-mapping a few arrays instead of parsing text.
+    Appends write every column in turn; a crash in between leaves some
+    columns longer than others, and the extra rows are dropped the next
+    time the archive is opened.
+
+    Usage
+    -----
+    archive = EvaluationArchive('evaluations')
+    archive.append(['KLAKLAK'], [0.9], [-0.3], generation=1, run_id=0)
+    archive.columns()['ff_amp_probability']
+    """
+
+    def __init__(self, path):
+        """Open the archive, creating the directory if needed.
+
+        Parameters
+        ----------
+        path : string
+            Path of the archive directory.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+        os.makedirs(path, exist_ok=True)
+        self._repair()
+
+    def __len__(self):
+        return self._count
+
+    def append(self, peptide_strings, ff_amp_probability, ff_toxicity, generation=0, run_id=0):
+        """Append evaluated peptides.
+
+        Parameters
+        ----------
+        peptide_strings : list
+            List of peptide strings.
+        ff_amp_probability : list
+            AMP probabilities of the peptides.
+        ff_toxicity : list
+            Toxicity objective (SVM score multiplied by -1) of the peptides.
+        generation : int or list
+            Generation in which the peptides were evaluated.
+        run_id : int or list
+            Identifier of the run that evaluated the peptides.
+
+        Raises
+        ------
+        ValueError
+            If a peptide contains a letter outside AMINO_ACIDS. Nothing is written then.
+        """
+        sequences, lengths = encode_sequences(peptide_strings)
+        n = len(lengths)
+
+        if n == 0:
+            return
+
+        values = {
+            'lengths': lengths,
+            'ff_amp_probability': ff_amp_probability,
+            'ff_toxicity': ff_toxicity,
+            'generation': np.broadcast_to(generation, n),
+            'run_id': np.broadcast_to(run_id, n),
+        }
+
+        with self._lock:
+            # Padding is at the end of every row, so the non-zero codes in
+            # row-major order are the residues of the peptides one after another.
+            with open(self._column_path(RESIDUES), 'ab') as file:
+                file.write(sequences[sequences > 0].tobytes())
+
+            for name, dtype in COLUMNS.items():
+                with open(self._column_path(name), 'ab') as file:
+                    file.write(np.asarray(values[name], dtype=dtype).tobytes())
+
+            self._count += n
+
+    def columns(self):
+        """Return read-only memory maps of all columns.
+
+        Returns
+        -------
+        Dictionary with a NumPy array per column of COLUMNS, plus 'residues'
+        and 'offsets' (start of every peptide in residues).
+        """
+        count = self._count
+        columns = {name: self._memmap(name, dtype, count) for name, dtype in COLUMNS.items()}
+
+        offsets = np.zeros(count, dtype=np.int64)
+        np.cumsum(columns['lengths'][:-1], out=offsets[1:])
+        columns['offsets'] = offsets
+        columns[RESIDUES] = self._memmap(RESIDUES, np.uint8, int(offsets[-1] + columns['lengths'][-1]) if count else 0)
+
+        return columns
+
+    def peptide_strings(self, start=0, stop=None, columns=None):
+        """Decode the peptides of rows start to stop."""
+        columns = columns if columns is not None else self.columns()
+        stop = len(self) if stop is None else min(stop, len(self))
+
+        if start >= stop:
+            return []
+
+        first = columns['offsets'][start]
+        last = columns['offsets'][stop - 1] + columns['lengths'][stop - 1]
+        text = CODE_TO_BYTE[columns[RESIDUES][first:last]].tobytes().decode()
+        boundaries = (columns['offsets'][start:stop] - first).tolist() + [last - first]
+
+        return [text[boundaries[index]:boundaries[index + 1]] for index in range(stop - start)]
+
+    def iter_rows(self, batch_size=100000, start=0, stop=None):
+        """Yield (peptide_string, ff_amp_probability, ff_toxicity, generation, run_id) tuples.
+
+        Rows start to stop (all rows by default) are decoded batch_size at a
+        time, so memory use stays bounded.
+        """
+        columns = self.columns()
+        stop = len(self) if stop is None else min(stop, len(self))
+
+        for batch_start in range(start, stop, batch_size):
+            batch_stop = min(batch_start + batch_size, stop)
+            yield from zip(
+                self.peptide_strings(batch_start, batch_stop, columns),
+                columns['ff_amp_probability'][batch_start:batch_stop].tolist(),
+                columns['ff_toxicity'][batch_start:batch_stop].tolist(),
+                columns['generation'][batch_start:batch_stop].tolist(),
+                columns['run_id'][batch_start:batch_stop].tolist()
+            )
+
+    def export_fasta(self, path, start=0, stop=None):
+        """Write the peptides of rows start to stop as FASTA, using each peptide string as its own id."""
+        with open(path, 'w') as file:
+            for peptide_string, _, _, _, _ in self.iter_rows(start=start, stop=stop):
+                file.write(f'>{peptide_string}\n{peptide_string}\n')
+
+    def export_csv(self, path, start=0, stop=None):
+        """Write rows start to stop to a CSV file with EXPORT_COLUMNS columns."""
+        with open(path, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(EXPORT_COLUMNS)
+            writer.writerows(self.iter_rows(start=start, stop=stop))
+
+    def export_xlsx(self, path, start=0, stop=None):
+        """Write rows start to stop to an Excel workbook with EXPORT_COLUMNS columns."""
+        from openpyxl import Workbook
+
+        # A write-only workbook streams rows to disk instead of keeping them in memory.
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet('evaluations')
+        sheet.append(EXPORT_COLUMNS)
+
+        for row in self.iter_rows(start=start, stop=stop):
+            sheet.append(row)
+
+        workbook.save(path)
+
+    def import_legacy(self, path, generation=-1, run_id=0):
+        """Append a legacy results file with one Python tuple per line.
+
+        Lines look like (peptide_list, peptide_string, ff_amp_probability, ff_toxicity),
+        as in sequenceFiles/. The files do not record generations, so all rows
+        get the given generation.
+
+        Returns
+        -------
+        Number of imported peptides.
+        """
+        results = load_legacy_results(path)
+        self.append(
+            [peptide_string for peptide_string, _, _ in results],
+            [ff_amp_probability for _, ff_amp_probability, _ in results],
+            [ff_toxicity for _, _, ff_toxicity in results],
+            generation,
+            run_id
+        )
+        return len(results)
+
+    def _column_path(self, name):
+        return os.path.join(self.path, name + '.bin')
+
+    def _memmap(self, name, dtype, count):
+        if count == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(self._column_path(name), dtype=dtype, mode='r', shape=(count,))
+
+    def _repair(self):
+        # Count complete rows and cut off whatever an interrupted append left
+        # behind. A row is complete when all its columns and all its residues
+        # were written, so files are only ever shortened, never padded.
+        count = None
+        for name, dtype in COLUMNS.items():
+            column_path = self._column_path(name)
+            rows = os.path.getsize(column_path) // np.dtype(dtype).itemsize if os.path.exists(column_path) else 0
+            count = rows if count is None else min(count, rows)
+
+        residues_path = self._column_path(RESIDUES)
+        residues_size = os.path.getsize(residues_path) if os.path.exists(residues_path) else 0
+        ends = np.cumsum(np.fromfile(self._column_path('lengths'), dtype=COLUMNS['lengths'], count=count)) \
+            if count else np.zeros(0, dtype=np.int64)
+        count = int(np.searchsorted(ends, residues_size, side='right'))
+
+        self._count = count
+        residues = int(ends[count - 1]) if count else 0
+
+        for name, dtype in dict(COLUMNS, **{RESIDUES: np.uint8}).items():
+            with open(self._column_path(name), 'ab') as file:
+                file.truncate((residues if name == RESIDUES else count) * np.dtype(dtype).itemsize)
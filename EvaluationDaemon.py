@@ -0,0 +1,298 @@
+import argparse
+import json
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import FitnessFunctionScraper
+from EvaluationEngine import EvaluationEngine
+from FitnessCache import FitnessCache
+
+EVALUATE_PATH = '/evaluate'
+STATS_PATH = '/stats'
+
+
+class EvaluationDaemon:
+    """Local HTTP service scoring peptides for many optimizers at once.
+
+    Clients (see Evaluators.DaemonEvaluator) POST peptide batches as JSON.
+    The daemon answers from a shared FitnessCache, lets a peptide that is
+    already being scored for one client wait for that result instead of
+    submitting it again, and merges the remaining peptides of all clients
+    arriving within batch_window seconds into one upstream batch. Every
+    distinct peptide is therefore scored upstream once for the whole fleet.
+
+    Usage
+    -----
+    with EvaluationDaemon(evaluator=EvaluationEngine()) as daemon:
+        NSGA_II(..., evaluator=DaemonEvaluator(daemon.url))
+    """
+
+    def __init__(self,
+                 evaluator=None,
+                 fitness_cache=None,
+                 host='127.0.0.1',
+                 port=0,
+                 batch_window=0.05,
+                 max_batch_size=500,
+                 max_upstream_batches=4):
+        """Configure the service.
+
+        Parameters
+        ----------
+        evaluator : Evaluator
+            Upstream evaluator. If None, an EvaluationEngine querying the live web services is used.
+        fitness_cache : FitnessCache
+            Cache shared by all clients. If None, an in-memory cache is used.
+        host : string
+            Interface to listen on.
+        port : int
+            Port to listen on, 0 picks a free one.
+        batch_window : float
+            Seconds to wait for more peptides before submitting an upstream batch.
+        max_batch_size : int
+            Maximum number of peptides in one upstream batch.
+        max_upstream_batches : int
+            Maximum number of upstream batches scored at the same time.
+        """
+        self.evaluator = evaluator if evaluator is not None else EvaluationEngine()
+        self.fitness_cache = fitness_cache if fitness_cache is not None else FitnessCache()
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+
+        # Number of requests, requested peptides, cache hits, coalesced peptides and upstream batches.
+        self.stats = Counter()
+
+        self._queue = []
+        self._in_flight = {}
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._executor = ThreadPoolExecutor(max_workers=max_upstream_batches)
+        self._batcher = None
+
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    def start(self):
+        self._batcher = threading.Thread(target=self._batch_loop, daemon=True)
+        self._batcher.start()
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+        if self._batcher is not None:
+            self._batcher.join()
+
+        # Batches already sent upstream finish normally, queued peptides never will.
+        self._executor.shutdown()
+
+        with self._condition:
+            futures = [self._in_flight.pop(peptide_string) for peptide_string in self._queue]
+            self._queue = []
+
+        for future in futures:
+            future.set_exception(FitnessFunctionScraper.ScraperError('Evaluation daemon stopped'))
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def evaluate(self, peptide_strings):
+        """Score peptides for a client, waiting for coalesced upstream batches.
+
+        Returns
+        -------
+        Dictionary peptide_string -> (ff_amp_probability, svm_score, prediction).
+        """
+        peptide_strings = list(dict.fromkeys(peptide_strings))
+        scores = self._cached_scores(peptide_strings)
+        futures = {}
+
+        with self._condition:
+            if self._stopped:
+                raise FitnessFunctionScraper.ScraperError('Evaluation daemon stopped')
+
+            # A batch may have finished since the look-up above. Batches write
+            # the cache before they leave _in_flight, so checking again under
+            # the lock ensures no peptide is submitted upstream twice.
+            scores.update(self._cached_scores([
+                peptide_string for peptide_string in peptide_strings
+                if peptide_string not in scores and peptide_string not in self._in_flight
+            ]))
+
+            self.stats['requests'] += 1
+            self.stats['peptides'] += len(peptide_strings)
+            self.stats['cache_hits'] += len(scores)
+
+            for peptide_string in peptide_strings:
+                if peptide_string in scores:
+                    continue
+
+                if peptide_string in self._in_flight:
+                    # Another client is already waiting for this peptide.
+                    self.stats['coalesced'] += 1
+                else:
+                    self._in_flight[peptide_string] = Future()
+                    self._queue.append(peptide_string)
+
+                futures[peptide_string] = self._in_flight[peptide_string]
+
+            self._condition.notify_all()
+
+        for peptide_string, future in futures.items():
+            result = future.result()
+            if result is not None:
+                scores[peptide_string] = result
+
+        return scores
+
+    def _cached_scores(self, peptide_strings):
+        amp_probabilities = self.fitness_cache.get_many(FitnessFunctionScraper.camp_predictor_key(), peptide_strings)
+        toxicities = self.fitness_cache.get_many(FitnessFunctionScraper.toxinpred_predictor_key(), peptide_strings)
+
+        return {
+            peptide_string: (amp_probabilities[peptide_string],) + tuple(toxicities[peptide_string])
+            for peptide_string in peptide_strings
+            if peptide_string in amp_probabilities and peptide_string in toxicities
+        }
+
+    def _batch_loop(self):
+        # Collect queued peptides for batch_window seconds (or until a batch
+        # is full) and hand them to the upstream executor as one batch.
+        while True:
+            with self._condition:
+                while not self._queue and not self._stopped:
+                    self._condition.wait()
+
+                if self._stopped:
+                    return
+
+                deadline = time.monotonic() + self.batch_window
+                while len(self._queue) < self.max_batch_size and not self._stopped:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+
+                if self._stopped:
+                    # stop() fails the peptides left in the queue.
+                    return
+
+                batch = self._queue[:self.max_batch_size]
+                del self._queue[:self.max_batch_size]
+                self.stats['upstream_batches'] += 1
+                self.stats['upstream_peptides'] += len(batch)
+
+            self._executor.submit(self._score_batch, batch)
+
+    def _score_batch(self, batch):
+        try:
+            scores = self.evaluator.evaluate(batch)
+        except Exception as error:
+            if isinstance(error, FitnessFunctionScraper.PartialEvaluationError):
+                # Keep the completed chunks, so retrying clients do not pay for them again.
+                self.fitness_cache.put_many(FitnessFunctionScraper.camp_predictor_key(),
+                                            list(error.amp_probabilities.items()))
+                self.fitness_cache.put_many(FitnessFunctionScraper.toxinpred_predictor_key(),
+                                            list(error.toxicities.items()))
+
+            with self._condition:
+                futures = [self._in_flight.pop(peptide_string) for peptide_string in batch]
+            for future in futures:
+                future.set_exception(error)
+            return
+
+        self.fitness_cache.put_many(FitnessFunctionScraper.camp_predictor_key(), [
+            (peptide_string, ff_amp_probability) for peptide_string, (ff_amp_probability, _, _) in scores.items()
+        ])
+        self.fitness_cache.put_many(FitnessFunctionScraper.toxinpred_predictor_key(), [
+            (peptide_string, (svm_score, prediction)) for peptide_string, (_, svm_score, prediction) in scores.items()
+        ])
+
+        with self._condition:
+            futures = [(self._in_flight.pop(peptide_string), scores.get(peptide_string)) for peptide_string in batch]
+        for future, result in futures:
+            future.set_result(result)
+
+    def _make_handler(self):
+        daemon = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                if self.path != EVALUATE_PATH:
+                    self._reply({'error': 'not found'}, status=404)
+                    return
+
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+
+                try:
+                    scores = daemon.evaluate(request['peptides'])
+                except Exception as error:
+                    self._reply({'error': '{}: {}'.format(type(error).__name__, error)}, status=502)
+                    return
+
+                self._reply({'scores': scores})
+
+            def do_GET(self):
+                if self.path == STATS_PATH:
+                    self._reply(dict(daemon.stats, **daemon.fitness_cache.stats()))
+                else:
+                    self._reply({'error': 'not found'}, status=404)
+
+            def _reply(self, body, status=200):
+                content = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+        return Handler
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve peptide scoring to several optimizers.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8100)
+    parser.add_argument('--cache', default='fitness_cache.db', help='Path of the shared SQLite fitness cache.')
+    parser.add_argument('--batch-window', type=float, default=0.05, help='Seconds to collect peptides into one batch.')
+    parser.add_argument('--camp-url', default=FitnessFunctionScraper.CAMP_URL)
+    parser.add_argument('--toxinpred-url', default=FitnessFunctionScraper.TOXINPRED_URL)
+    arguments = parser.parse_args()
+
+    daemon = EvaluationDaemon(
+        evaluator=EvaluationEngine(camp_url=arguments.camp_url, toxinpred_url=arguments.toxinpred_url),
+        fitness_cache=FitnessCache(arguments.cache),
+        host=arguments.host,
+        port=arguments.port,
+        batch_window=arguments.batch_window
+    )
+    print('Evaluation daemon: {}'.format(daemon.url))
+
+    try:
+        daemon.start()
+        daemon._thread.join()
+    except KeyboardInterrupt:
+        daemon.stop()
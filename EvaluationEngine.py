@@ -0,0 +1,191 @@
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import FitnessFunctionScraper
+from Evaluators import Evaluator
+from HttpClient import HttpClient
+
+
+class EvaluationEngine(Evaluator):
+    """Score peptides with the AMP and toxicity predictors concurrently.
+
+    Both predictors are queried at the same time from a thread pool through
+    an HttpClient, which pools connections per host and applies rate
+    limits, timeouts, retries and a circuit breaker. Large peptide sets are
+    split into chunks which are submitted in parallel; the client retries
+    every failed request on its own, and a chunk whose result table is
+    missing or truncated is requested again with backoff. Results of the two predictors are
+    joined by peptide id instead of by position.
+
+    This is the HTTP backend of the Evaluator interface. Point camp_url and
+    toxinpred_url at a StubPredictorServer to run without the internet.
+    """
+
+    def __init__(self,
+                 max_workers=4,
+                 pool_size=10,
+                 chunk_size=100,
+                 retries=3,
+                 backoff=1.0,
+                 camp_url=FitnessFunctionScraper.CAMP_URL,
+                 toxinpred_url=FitnessFunctionScraper.TOXINPRED_URL,
+                 http_client=None):
+        """Create the thread pool.
+
+        Parameters
+        ----------
+        max_workers : int
+            Maximum number of requests in flight at the same time.
+        pool_size : int
+            Maximum number of kept-alive connections per host.
+        chunk_size : int
+            Maximum number of peptides sent to a predictor in a single request.
+        retries : int
+            Number of retries of every failed request by the default HttpClient,
+            and of every chunk whose result table is missing or truncated.
+        backoff : float
+            Mean delay in seconds before the first retry of a request or chunk,
+            doubled for every next one.
+        camp_url : string
+            URL of the CAMP prediction form.
+        toxinpred_url : string
+            URL of the ToxinPred prediction form.
+        http_client : HttpClient
+            Client used for all requests. If None, one with pool_size, retries
+            and backoff is created.
+        """
+        self.max_workers = max_workers
+        self.pool_size = pool_size
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.backoff = backoff
+        self.camp_url = camp_url
+        self.toxinpred_url = toxinpred_url
+
+        if http_client is None:
+            http_client = HttpClient(pool_size=pool_size, retries=retries, backoff=backoff)
+        self.http_client = http_client
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def session_for(self, url):
+        """Return the pooled session used for the host of the url."""
+        return self.http_client.session_for(url)
+
+    def evaluate(self, peptide_strings, instrumentation=None):
+        """Score peptides with both predictors.
+
+        Parameters
+        ----------
+        peptide_strings : list
+            List of peptide strings.
+        instrumentation : Instrumentation
+            If set, receives the remote scoring timings and the request,
+            retry, timeout and circuit breaker counts of this call.
+
+        Returns
+        -------
+        Dictionary peptide_string -> (ff_amp_probability, svm_score, prediction).
+
+        Raises
+        ------
+        FitnessFunctionScraper.PartialEvaluationError
+            If a chunk failed or the results of the two predictors cannot be
+            joined by peptide id. It carries the results which did complete.
+        """
+        # The engine may be shared by several runs, so every call reports to its own caller.
+        session = self.http_client.reporting_to(instrumentation) if instrumentation is not None else self.http_client
+
+        amp_futures = FitnessFunctionScraper.submit_in_batches(
+            self._executor,
+            self._instrumented(FitnessFunctionScraper.scrape_fitness_function, 'remote_amp_scoring', instrumentation),
+            peptide_strings,
+            self.chunk_size,
+            retries=self.retries,
+            backoff=self.backoff,
+            session=session,
+            url=self.camp_url
+        )
+        toxicity_futures = FitnessFunctionScraper.submit_in_batches(
+            self._executor,
+            self._instrumented(FitnessFunctionScraper.toxicity, 'remote_toxicity_scoring', instrumentation),
+            peptide_strings,
+            self.chunk_size,
+            retries=self.retries,
+            backoff=self.backoff,
+            session=session,
+            url=self.toxinpred_url
+        )
+
+        amp_rows, amp_errors = self._chunk_results(amp_futures)
+        toxicity_rows, toxicity_errors = self._chunk_results(toxicity_futures)
+
+        # FASTA headers are the peptide strings, so both predictors report
+        # the peptide string as the peptide id. Only results of requested
+        # peptides are passed on, so nothing else can reach the fitness cache.
+        requested = set(peptide_strings)
+        amp_probabilities = {
+            peptide_id: float(ff_amp_probability) for peptide_id, ff_amp_probability in amp_rows
+            if peptide_id in requested
+        }
+        toxicity_by_id = {
+            peptide_id: (float(svm_score), prediction) for peptide_id, svm_score, prediction in toxicity_rows
+            if peptide_id in requested
+        }
+
+        errors = amp_errors + toxicity_errors
+        if errors:
+            # Hand the completed chunks to the caller, so they are not paid for again.
+            raise FitnessFunctionScraper.PartialEvaluationError(
+                '{} of {} chunks failed'.format(len(errors), len(amp_futures) + len(toxicity_futures)),
+                amp_probabilities,
+                toxicity_by_id
+            ) from errors[0]
+
+        # Ids reported by only one predictor, and requested peptides reported by neither.
+        reported = [row[0] for row in amp_rows] + [row[0] for row in toxicity_rows]
+        unjoined = [
+            peptide_id for peptide_id in dict.fromkeys(reported + list(peptide_strings))
+            if peptide_id not in amp_probabilities or peptide_id not in toxicity_by_id
+        ]
+        if unjoined:
+            raise FitnessFunctionScraper.PartialEvaluationError(
+                'Predictor results could not be joined by peptide id: {}{}'.format(
+                    ', '.join(unjoined[:10]), ' and {} more'.format(len(unjoined) - 10) if len(unjoined) > 10 else ''),
+                amp_probabilities,
+                toxicity_by_id
+            )
+
+        return {
+            peptide_id: (amp_probabilities[peptide_id],) + toxicity_by_id[peptide_id]
+            for peptide_id in dict.fromkeys(peptide_strings)
+        }
+
+    @staticmethod
+    def _chunk_results(futures):
+        # Wait for every chunk, also after a failure, and collect rows and errors.
+        rows = []
+        errors = []
+        for future in futures:
+            try:
+                rows.extend(future.result())
+            except Exception as error:
+                errors.append(error)
+        return rows, errors
+
+    @staticmethod
+    def _instrumented(scraper, timer_name, instrumentation):
+        # Time every request of the scraper, summed over concurrent chunks.
+        if instrumentation is None:
+            return scraper
+
+        @functools.wraps(scraper)
+        def timed_scraper(*args, **kwargs):
+            with instrumentation.timer(timer_name):
+                return scraper(*args, **kwargs)
+
+        return timed_scraper
+
+    def close(self):
+        """Shut the thread pool down and close all sessions."""
+        self._executor.shutdown()
+        self.http_client.close()
@@ -0,0 +1,252 @@
+import json
+import os
+import threading
+from concurrent.futures import Future
+
+import requests
+
+import FitnessFunctionScraper
+
+
+class Evaluator:
+    """Interface of the fitness evaluators accepted by NSGA_II.
+
+    An evaluator scores a batch of peptides with both predictors. Available
+    backends are EvaluationEngine (the HTTP scrapers, pointed either at the
+    live services or at a local StubPredictorServer), RecordReplayEvaluator,
+    DaemonEvaluator (a shared EvaluationDaemon) and CoalescingEvaluator
+    (one evaluator shared by concurrent runs in the same process).
+
+    One evaluator may serve several runs, so timings and counters are
+    reported to the Instrumentation passed with every call, not kept on
+    the evaluator.
+    """
+
+    def evaluate(self, peptide_strings, instrumentation=None):
+        """Score peptides with both predictors.
+
+        Parameters
+        ----------
+        peptide_strings : list
+            List of peptide strings.
+        instrumentation : Instrumentation
+            Receives the timings and counters of this call, if the backend reports any.
+
+        Returns
+        -------
+        Dictionary peptide_string -> (ff_amp_probability, svm_score, prediction).
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Release resources held by the evaluator."""
+
+
+class RecordReplayEvaluator(Evaluator):
+    """Evaluator which stores scores on disk and serves them again later.
+
+    With a wrapped evaluator, peptides not in the recording are scored by it
+    and appended to the recording (record mode). Without one, only recorded
+    peptides can be scored (replay mode), which needs no network at all.
+    """
+
+    def __init__(self, path, evaluator=None):
+        """Load the recording.
+
+        Parameters
+        ----------
+        path : string
+            Path of the JSON lines recording, one scored peptide per line.
+        evaluator : Evaluator
+            Evaluator used for peptides missing from the recording. If None,
+            missing peptides raise a KeyError.
+        """
+        self.path = path
+        self.evaluator = evaluator
+
+        self._scores = {}
+        self._lock = threading.Lock()
+
+        if os.path.exists(path):
+            with open(path, 'r') as file:
+                for line in file:
+                    if line.strip():
+                        record = json.loads(line)
+                        self._scores[record['peptide']] = (record['ff_amp_probability'],
+                                                           record['svm_score'],
+                                                           record['prediction'])
+
+    def evaluate(self, peptide_strings, instrumentation=None):
+        with self._lock:
+            missing = [peptide_string for peptide_string in dict.fromkeys(peptide_strings)
+                       if peptide_string not in self._scores]
+
+        if missing:
+            if self.evaluator is None:
+                raise KeyError('{} peptides are not in the recording {}, e.g. {}'.format(
+                    len(missing), self.path, missing[0]))
+
+            scores = self.evaluator.evaluate(missing, instrumentation)
+
+            with self._lock:
+                with open(self.path, 'a') as file:
+                    for peptide_string, (ff_amp_probability, svm_score, prediction) in scores.items():
+                        file.write(json.dumps({
+                            'peptide': peptide_string,
+                            'ff_amp_probability': ff_amp_probability,
+                            'svm_score': svm_score,
+                            'prediction': prediction,
+                        }) + '\n')
+                        self._scores[peptide_string] = (ff_amp_probability, svm_score, prediction)
+
+        with self._lock:
+            return {
+                peptide_string: self._scores[peptide_string]
+                for peptide_string in peptide_strings if peptide_string in self._scores
+            }
+
+    def close(self):
+        if self.evaluator is not None:
+            self.evaluator.close()
+
+
+class DaemonEvaluator(Evaluator):
+    """Evaluator which scores peptides through a running EvaluationDaemon."""
+
+    def __init__(self, url, timeout=None):
+        """Connect to the daemon.
+
+        Parameters
+        ----------
+        url : string
+            Base URL of the daemon, e.g. 'http://127.0.0.1:8100'.
+        timeout : float
+            Seconds to wait for a batch. If None, waits as long as the upstream services take.
+        """
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self._session = requests.Session()
+
+    def evaluate(self, peptide_strings, instrumentation=None):
+        response = self._session.post(self.url + '/evaluate', json={'peptides': list(peptide_strings)},
+                                      timeout=self.timeout)
+
+        if response.status_code != 200:
+            raise FitnessFunctionScraper.ScraperError('Evaluation daemon failed with status {}: {}'.format(
+                response.status_code, response.text))
+
+        return {
+            peptide_string: tuple(score) for peptide_string, score in response.json()['scores'].items()
+        }
+
+    def close(self):
+        self._session.close()
+
+
+class CoalescingEvaluator(Evaluator):
+    """Evaluator shared by concurrent runs, sending every peptide upstream once.
+
+    A peptide requested while another caller is already scoring it is not
+    submitted again; the caller waits for the running request instead, like
+    EvaluationDaemon.evaluate does across processes. Results are stored in
+    the shared fitness cache before they stop being in flight, so a caller
+    which looks them up afterwards finds them in the cache.
+    """
+
+    def __init__(self, evaluator, fitness_cache):
+        """Wrap a shared evaluator.
+
+        Parameters
+        ----------
+        evaluator : Evaluator
+            Evaluator which scores the peptides.
+        fitness_cache : FitnessCache
+            Cache shared by all callers.
+        """
+        self.evaluator = evaluator
+        self.fitness_cache = fitness_cache
+
+        # Future of every peptide being scored, keyed by peptide string.
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def evaluate(self, peptide_strings, instrumentation=None):
+        peptide_strings = list(dict.fromkeys(peptide_strings))
+        owned = {}
+        waiting = {}
+
+        with self._lock:
+            # A request may have finished since the caller looked the peptides
+            # up. Requests write the cache before they leave _in_flight, so
+            # checking again under the lock ensures no peptide is submitted twice.
+            scores = self._cached_scores([
+                peptide_string for peptide_string in peptide_strings if peptide_string not in self._in_flight
+            ])
+
+            for peptide_string in peptide_strings:
+                if peptide_string in scores:
+                    continue
+
+                if peptide_string in self._in_flight:
+                    waiting[peptide_string] = self._in_flight[peptide_string]
+                else:
+                    owned[peptide_string] = self._in_flight[peptide_string] = Future()
+
+        if owned:
+            scores.update(self._score(owned, instrumentation))
+
+        for peptide_string, future in waiting.items():
+            scores[peptide_string] = future.result()
+
+        return scores
+
+    def close(self):
+        self.evaluator.close()
+
+    def _score(self, owned, instrumentation):
+        # Score the peptides this caller is responsible for and hand the
+        # results (or the error) to every caller waiting for them.
+        try:
+            scores = self.evaluator.evaluate(list(owned), instrumentation)
+        except Exception as error:
+            if isinstance(error, FitnessFunctionScraper.PartialEvaluationError):
+                self.fitness_cache.put_many(FitnessFunctionScraper.camp_predictor_key(),
+                                            list(error.amp_probabilities.items()))
+                self.fitness_cache.put_many(FitnessFunctionScraper.toxinpred_predictor_key(),
+                                            list(error.toxicities.items()))
+
+            with self._lock:
+                for peptide_string in owned:
+                    del self._in_flight[peptide_string]
+            for future in owned.values():
+                future.set_exception(error)
+            raise
+
+        self.fitness_cache.put_many(FitnessFunctionScraper.camp_predictor_key(), [
+            (peptide_string, ff_amp_probability) for peptide_string, (ff_amp_probability, _, _) in scores.items()
+        ])
+        self.fitness_cache.put_many(FitnessFunctionScraper.toxinpred_predictor_key(), [
+            (peptide_string, (svm_score, prediction)) for peptide_string, (_, svm_score, prediction) in scores.items()
+        ])
+
+        with self._lock:
+            for peptide_string in owned:
+                del self._in_flight[peptide_string]
+        for peptide_string, future in owned.items():
+            if peptide_string in scores:
+                future.set_result(scores[peptide_string])
+            else:
+                future.set_exception(FitnessFunctionScraper.ScraperError(
+                    'Peptide {} was not scored'.format(peptide_string)))
+
+        return scores
+
+    def _cached_scores(self, peptide_strings):
+        amp_probabilities = self.fitness_cache.get_many(FitnessFunctionScraper.camp_predictor_key(), peptide_strings)
+        toxicities = self.fitness_cache.get_many(FitnessFunctionScraper.toxinpred_predictor_key(), peptide_strings)
+
+        return {
+            peptide_string: (amp_probabilities[peptide_string],) + tuple(toxicities[peptide_string])
+            for peptide_string in peptide_strings
+            if peptide_string in amp_probabilities and peptide_string in toxicities
+        }
@@ -0,0 +1,173 @@
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+
+
+class FitnessCache:
+    """Two-level cache for remote predictor results.
+
+    Entries are keyed by (predictor_key, peptide_string), where predictor_key
+    identifies the predictor together with the settings it was called with,
+    so results obtained with different settings never mix.
+
+    The first level is an in-memory LRU dictionary with a bounded number of
+    entries. The second (optional) level is an SQLite database on disk which
+    survives between runs.
+    """
+
+    def __init__(self, path=None, max_entries=100000):
+        """Open the cache.
+
+        Parameters
+        ----------
+        path : string
+            Path of the SQLite database. If None, the cache lives only in memory.
+        max_entries : int
+            Maximum number of entries kept in the in-memory layer.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._connection = None
+
+        if path is not None:
+            self._connection = sqlite3.connect(path, check_same_thread=False)
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS fitness ('
+                'predictor TEXT NOT NULL, '
+                'peptide TEXT NOT NULL, '
+                'value TEXT NOT NULL, '
+                'PRIMARY KEY (predictor, peptide))'
+            )
+            self._connection.commit()
+
+    def get(self, predictor_key, peptide_string):
+        """Return the cached value or None if the peptide was not scored yet."""
+        return self.get_many(predictor_key, [peptide_string]).get(peptide_string)
+
+    def get_many(self, predictor_key, peptide_strings):
+        """Look up several peptides at once.
+
+        Parameters
+        ----------
+        predictor_key : string
+            Predictor identity and settings.
+        peptide_strings : list
+            Peptide strings to look up.
+
+        Returns
+        -------
+        Dictionary peptide_string -> value containing only the cache hits.
+        """
+        found = {}
+
+        with self._lock:
+            not_in_memory = []
+
+            for peptide_string in peptide_strings:
+                key = (predictor_key, peptide_string)
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[peptide_string] = self._memory[key]
+                else:
+                    not_in_memory.append(peptide_string)
+
+            if self._connection is not None and not_in_memory:
+                for peptide_string, value in self._select(predictor_key, set(not_in_memory)):
+                    found[peptide_string] = json.loads(value)
+                    self._remember((predictor_key, peptide_string), found[peptide_string])
+
+            for peptide_string in peptide_strings:
+                if peptide_string in found:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+
+        return found
+
+    def put(self, predictor_key, peptide_string, value):
+        """Store a single value."""
+        self.put_many(predictor_key, [(peptide_string, value)])
+
+    def put_many(self, predictor_key, items):
+        """Store several values.
+
+        Parameters
+        ----------
+        predictor_key : string
+            Predictor identity and settings.
+        items : list
+            List of (peptide_string, value) tuples. Values must be JSON serializable.
+        """
+        items = list(items)
+
+        with self._lock:
+            for peptide_string, value in items:
+                self._remember((predictor_key, peptide_string), value)
+
+            if self._connection is not None and items:
+                self._connection.executemany(
+                    'INSERT OR REPLACE INTO fitness (predictor, peptide, value) VALUES (?, ?, ?)',
+                    [(predictor_key, peptide_string, json.dumps(value)) for peptide_string, value in items]
+                )
+                self._connection.commit()
+
+    def items(self, predictor_key):
+        """Return all stored (peptide_string, value) tuples of a predictor."""
+        with self._lock:
+            entries = {
+                peptide_string: value for (key, peptide_string), value in self._memory.items() if key == predictor_key
+            }
+
+            if self._connection is not None:
+                for peptide_string, value in self._connection.execute(
+                        'SELECT peptide, value FROM fitness WHERE predictor = ?', (predictor_key,)):
+                    entries.setdefault(peptide_string, json.loads(value))
+
+        return list(entries.items())
+
+    def stats(self):
+        """Return hit and miss counts of the cache.
+
+        Counts are per (predictor_key, peptide_string) lookup, so a peptide
+        looked up for both predictors counts twice.
+        """
+        lookups = self.hits + self.misses
+        return {
+            'lookup_hits': self.hits,
+            'lookup_misses': self.misses,
+            'lookup_hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries_in_memory': len(self._memory),
+        }
+
+    def close(self):
+        """Close the on-disk store."""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _remember(self, key, value):
+        # Insert into the in-memory layer and evict the least recently used
+        # entries once the layer is full.
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _select(self, predictor_key, peptide_strings):
+        # SQLite limits the number of bound parameters, so query in chunks.
+        peptide_strings = list(peptide_strings)
+        rows = []
+        for start in range(0, len(peptide_strings), 500):
+            chunk = peptide_strings[start:start + 500]
+            rows.extend(self._connection.execute(
+                'SELECT peptide, value FROM fitness WHERE predictor = ? AND peptide IN ({})'.format(
+                    ', '.join('?' * len(chunk))),
+                [predictor_key] + chunk
+            ).fetchall())
+        return rows
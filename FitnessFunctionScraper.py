@@ -1,104 +1,260 @@
-import pandas as pd
-import requests
-from bs4 import BeautifulSoup
 import urllib3
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
 
-def scrape_fitness_function():
+import ResultTableParser
+from HttpClient import HttpClient
+
+CAMP_URL = 'https://www.camp.bicnirrh.res.in/predict/hii.php'
+TOXINPRED_URL = 'https://webs.iiitd.edu.in/raghava/toxinpred/multiple_test.php'
+
+# CAMP settings: dataset and prediction algorithms.
+CAMP_SETTINGS = {
+    'dataset': 'synthetic',
+    'algo[]': ['rf'],
+}
+
+# ToxinPred settings: SVM (Swiss-Prot) based method, E-value cut-off and SVM threshold.
+TOXINPRED_SETTINGS = {
+    'method': '1',
+    'eval': '0.1',
+    'thval': '0.0',
+}
+
+
+def predictor_key(name, settings):
+    """Return a string identifying a predictor together with its settings."""
+    return '{}:{}'.format(name, json.dumps(settings, sort_keys=True))
+
+
+def camp_predictor_key():
+    return predictor_key('camp', CAMP_SETTINGS)
+
+
+def toxinpred_predictor_key():
+    return predictor_key('toxinpred', TOXINPRED_SETTINGS)
+
+
+class ScraperError(Exception):
+    """Raised when a predictor does not return a usable result."""
+
+
+class PartialEvaluationError(ScraperError):
+    """Raised when some chunks of an evaluation failed.
+
+    Carries the results of the chunks which completed, per predictor, so
+    they can be cached before the error propagates.
+
+    Attributes
+    ----------
+    amp_probabilities : dict
+        peptide_string -> ff_amp_probability of the completed CAMP chunks.
+    toxicities : dict
+        peptide_string -> (svm_score, prediction) of the completed ToxinPred chunks.
+    """
+
+    def __init__(self, message, amp_probabilities, toxicities):
+        super().__init__(message)
+        self.amp_probabilities = amp_probabilities
+        self.toxicities = toxicities
+
+
+def to_fasta(peptides):
+    """Return FASTA text for peptide strings, using each string as its own id."""
+    return ''.join(f'>{peptide_string}\n{peptide_string}\n' for peptide_string in peptides)
+
+
+def retry_incomplete(fetch, is_complete, retries=0, backoff=1.0):
+    """Call fetch until its result is complete, with exponential backoff.
+
+    HttpClient already retries connection errors, timeouts and 429/5xx
+    responses, so is_complete should accept error responses as final. This
+    covers answers which arrive fine but are unusable, e.g. an error page
+    sent with status 200 or a result table cut short.
+
+    Parameters
+    ----------
+    fetch : function
+        Sends the request and returns its parsed result.
+    is_complete : function
+        Returns True if a result of fetch is usable.
+    retries : int
+        Number of calls after the first incomplete result.
+    backoff : float
+        Seconds to wait before the first retry, doubled for every next one.
+
+    Returns
+    -------
+    The first complete result, or the last result if none was complete.
+    """
+    for attempt in range(retries + 1):
+        if attempt:
+            time.sleep(backoff * 2 ** (attempt - 1))
+
+        result = fetch()
+        if is_complete(result):
+            break
+
+    return result
+
+
+def _complete(rows, peptides):
+    # A result table is usable when it has one row per submitted peptide.
+    return rows is not None and len(rows) == len(peptides)
+
+
+def scrape_fitness_function(peptides, session=None, url=CAMP_URL, retries=0, backoff=1.0):
     urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-    url = 'https://www.camp.bicnirrh.res.in/predict/hii.php'
-    file_path = 'in.txt'
-    data = {
-        'dataset': 'synthetic',
-        'algo[]': ['rf'],
-    }
+    # Reuse the caller's (pooled) session or HttpClient if there is one.
+    if session is None:
+        session = HttpClient()
 
-    with open(file_path, 'rb') as file:
-        files = {'userfile': (file.name, file, 'text/plain')}
-        response = requests.post(url, data=data, files=files, verify=False)
+    data = dict(CAMP_SETTINGS)
 
-    if response.status_code == 200:
-        soup = BeautifulSoup(response.text, 'html.parser')
-        table = soup.find('table', attrs={'border': '1'})
-        rows = table.find_all('tr')
-        data = []
+    # Upload the FASTA straight from memory, no temporary file is needed.
+    # Bytes (unlike a file object) can be sent again when a request is retried.
+    files = {'userfile': ('in.txt', to_fasta(peptides).encode(), 'text/plain')}
+
+    def submit():
+        response = session.post(url, data=data, files=files, verify=False)
+        return response, ResultTableParser.camp_rows(response.text) if response.status_code == 200 else None
 
-        for row in rows[1:]:
-            cols = row.find_all('td')
-            data.append((cols[0].text, cols[2].text))  # Create a tuple (peptide_string, ff_amp_probability)
+    # The results come with the response of the form, so an unusable result
+    # means submitting again. Error statuses were already retried by HttpClient.
+    response, rows = retry_incomplete(
+        submit, lambda result: result[0].status_code != 200 or _complete(result[1], peptides), retries, backoff)
 
-        return data
+    if response.status_code == 200:
+        # Tuples (peptide_string, ff_amp_probability); None if the result table is missing
+        return rows
     else:
         print("Failed to submit the form. Status code:", response.status_code)
         return None
-    
 
-from bs4 import BeautifulSoup
 
-def toxicity():
-    with open('in.txt', 'r') as file:
-        peptide_sequences = file.read()
+def toxicity(peptides, session=None, url=TOXINPRED_URL, retries=0, backoff=1.0):
+    peptide_sequences = to_fasta(peptides)
 
     # Prepare the data to be sent in the form
     data = {
         'seq': peptide_sequences,
-        'method': '1',  # SVM (Swiss-Prot) based
-        'eval': '0.1',  # E-value cut-off
-        'thval': '0.0',  # SVM threshold
+        **TOXINPRED_SETTINGS,
         'field[]': ['4', '7', '9', '11', '13']  # Physicochemical properties to be displayed
     }
 
-    # Create a session
-    session = requests.Session()
+    # Create a client unless the caller shares a pooled one
+    if session is None:
+        session = HttpClient()
 
-    # Send a POST request to the form's action URL
-    response = session.post('https://webs.iiitd.edu.in/raghava/toxinpred/multiple_test.php', data=data)
+    def submit():
+        # Send a POST request to the form's action URL and find the URL of the meta refresh tag
+        response = session.post(url, data=data)
+        return response, ResultTableParser.meta_refresh_url(response.text)
 
-    # Parse the response content with BeautifulSoup
-    soup = BeautifulSoup(response.content, 'html.parser')
-
-    # Find the meta refresh tag
-    meta_refresh = soup.find('meta', attrs={'http-equiv': 'refresh'})
+    # The form is only submitted again while it has not been accepted.
+    response, relative_url = retry_incomplete(
+        submit, lambda result: result[0].status_code != 200 or bool(result[1]), retries, backoff)
 
     # If the meta refresh tag is found
-    if meta_refresh:
-        # Get the URL from the content attribute of the meta refresh tag
-        relative_url = meta_refresh['content'].split('url=')[1]
+    if relative_url:
+        # Form the absolute URL relative to the form's action URL
+        absolute_url = urljoin(url, relative_url)
+
+        def fetch():
+            # Send a GET request to the new URL and extract peptide id, SVM
+            # score and prediction from the table with id "tableTwo"
+            response = session.get(absolute_url)
+            return response, ResultTableParser.toxinpred_rows(response.text) if response.status_code == 200 else None
+
+        # A missing or short result table is fetched again, without submitting the form again.
+        _, rows = retry_incomplete(
+            fetch, lambda result: result[0].status_code != 200 or _complete(result[1], peptides), retries, backoff)
 
-        # Form the absolute URL by prepending the base URL
-        absolute_url = 'https://webs.iiitd.edu.in/raghava/toxinpred/' + relative_url
+        if rows is None:
+            return None
 
-        # Send a GET request to the new URL
-        response = session.get(absolute_url)
+        # Return the list of peptide id and SVM score values
+        return [(peptide_id, float(svm_score) * (-1.0), toxic) for peptide_id, svm_score, toxic in rows]
+    else:
+        print('Failed to submit the form. Status code:', response.status_code)
 
-        # Parse the content of the new page
-        soup = BeautifulSoup(response.text, 'html.parser')
 
-        # Find the table with id "tableTwo"
-        table = soup.find('table', {'id': 'tableTwo'})
+def split_into_chunks(peptides, chunk_size):
+    """Split a list of peptide strings into consecutive chunks of at most chunk_size."""
+    return [peptides[start:start + chunk_size] for start in range(0, len(peptides), chunk_size)]
 
-        # Initialize an empty list to store the peptide id and SVM score values
-        peptide_scores = []
 
-        # If the table is found
-        if table:
-            # Find all the rows in the table body
-            rows = table.find('tbody').find_all('tr')
+def score_chunk(scraper, peptides, retries=2, backoff=1.0, **kwargs):
+    """Call a scraper for a single chunk and check that every peptide was scored.
 
-            # For each row
-            for row in rows:
-                # Find all the columns
-                cols = row.find_all('td')
+    Failed requests are retried by the HttpClient passed as session (or
+    created by the scraper). A missing or truncated result table is
+    requested again by the scraper itself, up to retries times; ToxinPred
+    then only fetches its result page again instead of resubmitting.
 
-                # Get the peptide id and SVM score values
-                peptide_id = cols[0].text
-                svm_score = cols[2].text
-                toxic = cols[3].text
+    Parameters
+    ----------
+    scraper : function
+        scrape_fitness_function or toxicity.
+    peptides : list
+        Peptide strings of the chunk.
+    retries : int
+        Number of retries of a chunk whose results are missing or truncated.
+    backoff : float
+        Seconds to wait before the first of these retries, doubled for every next one.
+    kwargs
+        Forwarded to the scraper (session, url).
 
-                # Append the values to the list
-                peptide_scores.append((peptide_id, float(svm_score) * (-1.0), toxic))
+    Returns
+    -------
+    List of result tuples, one per peptide.
+    """
+    result = scraper(peptides, retries=retries, backoff=backoff, **kwargs)
 
-        # Return the list of peptide id and SVM score values
-        return peptide_scores
-    else:
-        print('Failed to submit the form. Status code:', response.status_code)
\ No newline at end of file
+    # A missing or truncated result table is as bad as a failed request.
+    if result is None or len(result) != len(peptides):
+        raise ScraperError('{} returned {} of {} results'.format(
+            scraper.__name__, 'none' if result is None else len(result), len(peptides)))
+
+    return result
+
+
+def submit_in_batches(executor, scraper, peptides, chunk_size=100, **kwargs):
+    """Submit one score_chunk job per chunk to the executor.
+
+    Returns
+    -------
+    List of futures in chunk order.
+    """
+    return [
+        executor.submit(score_chunk, scraper, chunk, **kwargs)
+        for chunk in split_into_chunks(list(peptides), chunk_size)
+    ]
+
+
+def score_in_batches(scraper, peptides, chunk_size=100, max_workers=4, **kwargs):
+    """Score peptides in chunks submitted in parallel and merge the results in order.
+
+    Parameters
+    ----------
+    scraper : function
+        scrape_fitness_function or toxicity.
+    peptides : list
+        Peptide strings.
+    chunk_size : int
+        Maximum number of peptides per request.
+    max_workers : int
+        Maximum number of chunks in flight at the same time.
+    kwargs
+        Forwarded to the scraper (session, url).
+
+    Returns
+    -------
+    List of result tuples in the same order as peptides.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = submit_in_batches(executor, scraper, peptides, chunk_size, **kwargs)
+        return [row for future in futures for row in future.result()]
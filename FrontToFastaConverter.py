@@ -1,13 +1,32 @@
-import ast
-
-with open('NSGA-II_peptide_evolution\sequenceFiles\Doabr.txt', 'r') as file:
-    lines = file.readlines()
-
-with open('format.txt', 'w') as file:
-    for i, line in enumerate(lines):
-        # Parse the line as a Python literal
-        data = ast.literal_eval(line.strip())
-        # Extract the peptide sequence string
-        peptide_sequence = data[1]
-        # Write the peptide sequence to the file in FASTA format
-        file.write(f'>{peptide_sequence}\n{peptide_sequence}\n')
\ No newline at end of file
+import argparse
+import os
+import tempfile
+
+from EvaluationArchive import EvaluationArchive
+
+EXPORTERS = {
+    'fasta': EvaluationArchive.export_fasta,
+    'csv': EvaluationArchive.export_csv,
+    'xlsx': EvaluationArchive.export_xlsx,
+}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export an evaluation archive or legacy results file as FASTA, CSV or xlsx.')
+    parser.add_argument('input', help='EvaluationArchive directory or legacy .txt results file.')
+    parser.add_argument('output', nargs='?', default='format.txt')
+    parser.add_argument('--format', choices=sorted(EXPORTERS), default='fasta')
+    parser.add_argument('--archive', help='Keep the imported legacy file as an EvaluationArchive in this directory.')
+    parser.add_argument('--run-id', type=int, default=0, help='Run id of the imported legacy rows.')
+    arguments = parser.parse_args()
+
+    if os.path.isdir(arguments.input):
+        EXPORTERS[arguments.format](EvaluationArchive(arguments.input), arguments.output)
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            archive = EvaluationArchive(arguments.archive or directory)
+
+            # --archive may name an archive with earlier imports; export only this file's rows.
+            start = len(archive)
+            count = archive.import_legacy(arguments.input, run_id=arguments.run_id)
+            EXPORTERS[arguments.format](archive, arguments.output, start)
+        print('Exported {} peptides to {}'.format(count, arguments.output))
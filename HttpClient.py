@@ -0,0 +1,399 @@
+import random
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Responses which mean the service is overloaded or temporarily down.
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# Request errors which are worth retrying; others (e.g. TooManyRedirects) are raised right away.
+RETRY_EXCEPTIONS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+
+
+class TokenBucket:
+    """Limit the rate of requests to `rate` per second with bursts of up to `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available and take it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                delay = (1 - self.tokens) / self.rate
+
+            time.sleep(delay)
+
+
+class AdaptiveConcurrencyLimiter:
+    """Limit concurrent requests with additive increase, multiplicative decrease (AIMD).
+
+    Every successful request raises the limit by 1 / limit, i.e. by about
+    one per round of requests. A failed request (error status, timeout) or
+    one slower than latency_target cuts the limit by decrease_factor.
+    """
+
+    def __init__(self, initial=4, minimum=1, maximum=32, decrease_factor=0.5, latency_target=None):
+        """Configure the limiter.
+
+        Parameters
+        ----------
+        initial : int
+            Initial number of concurrent requests.
+        minimum : int
+            Lowest limit.
+        maximum : int
+            Highest limit.
+        decrease_factor : float
+            Factor the limit is multiplied with on congestion.
+        latency_target : float
+            Seconds above which a successful response also counts as congestion.
+            If None, only errors decrease the limit.
+        """
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease_factor = decrease_factor
+        self.latency_target = latency_target
+        self.in_flight = 0
+
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """Block until fewer than limit requests are in flight."""
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, latency, success):
+        """Finish a request and adapt the limit to its outcome."""
+        with self._condition:
+            self.in_flight -= 1
+
+            if success and (self.latency_target is None or latency <= self.latency_target):
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            else:
+                self.limit = max(self.minimum, self.limit * self.decrease_factor)
+
+            self._condition.notify_all()
+
+
+class CircuitBreaker:
+    """Stop sending requests to a host after repeated failures.
+
+    After failure_threshold consecutive failures the circuit opens and
+    requests wait for reset_timeout seconds instead of hammering a service
+    which is down. Then requests are let through again; the circuit closes
+    on the first success and opens again on the next failure.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def wait_until_closed(self):
+        """Block while the circuit is open.
+
+        Returns
+        -------
+        Seconds spent waiting.
+        """
+        waited = 0.0
+
+        while True:
+            with self._lock:
+                if self.opened_at is None:
+                    return waited
+                remaining = self.opened_at + self.reset_timeout - time.monotonic()
+                if remaining <= 0:
+                    # Half-open: let requests probe the service.
+                    return waited
+
+            time.sleep(remaining)
+            waited += remaining
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class HostState:
+    """Session, rate limit, concurrency limit and circuit breaker of one host."""
+
+    def __init__(self, session, bucket, limiter, breaker):
+        self.session = session
+        self.bucket = bucket
+        self.limiter = limiter
+        self.breaker = breaker
+
+
+class HttpClient:
+    """HTTP client which keeps the prediction services at a sustainable load.
+
+    Every host gets a pooled requests.Session, a token bucket rate limit,
+    an AIMD concurrency limit and a circuit breaker. Requests get connect
+    and read timeouts, and failed requests (connection errors, timeouts,
+    429 and 5xx responses) are retried with jittered exponential backoff.
+    This is the only retry layer for transport failures: callers only
+    resubmit when a response arrives but its content is unusable.
+
+    The client has the post and get methods of a requests.Session, so it
+    can be passed as the session of the FitnessFunctionScraper functions.
+    Its counts are kept in stats; reporting_to returns a view of the client
+    whose requests are also counted in the Instrumentation of one run.
+    """
+
+    def __init__(self,
+                 rate=None,
+                 burst=5,
+                 pool_size=10,
+                 connect_timeout=10.0,
+                 read_timeout=120.0,
+                 retries=3,
+                 backoff=1.0,
+                 initial_concurrency=4,
+                 max_concurrency=32,
+                 latency_target=None,
+                 failure_threshold=3,
+                 reset_timeout=30.0,
+                 max_outage=None,
+                 seed=None):
+        """Configure the limits.
+
+        Parameters
+        ----------
+        rate : float
+            Maximum requests per second per host. If None, requests are not rate limited.
+        burst : int
+            Token bucket capacity, i.e. requests allowed in a burst.
+        pool_size : int
+            Maximum number of kept-alive connections per host.
+        connect_timeout : float
+            Seconds to wait for a connection.
+        read_timeout : float
+            Seconds to wait for the response.
+        retries : int
+            Number of retries of a failed request.
+        backoff : float
+            Mean delay in seconds before the first retry, doubled for every next one.
+        initial_concurrency : int
+            Initial number of concurrent requests per host.
+        max_concurrency : int
+            Highest number of concurrent requests per host.
+        latency_target : float
+            Response time in seconds above which the concurrency is decreased.
+        failure_threshold : int
+            Consecutive failures which open the circuit of a host. At most
+            retries + 1, so a host which stays down opens the circuit before
+            a request runs out of retries.
+        reset_timeout : float
+            Seconds an open circuit pauses requests.
+        max_outage : float
+            Seconds a request waits for a host with an open circuit before it
+            fails. If None, it waits until the host recovers.
+        seed : int
+            Seed of the backoff jitter.
+        """
+        self.rate = rate
+        self.burst = burst
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.initial_concurrency = initial_concurrency
+        self.max_concurrency = max_concurrency
+        self.latency_target = latency_target
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_outage = max_outage
+
+        # Number of requests, retries, timeouts, failures and circuit pauses.
+        self.stats = Counter()
+
+        self._hosts = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def host_state(self, url):
+        """Return the state of the host of the url, creating it on first use."""
+        host = urlsplit(url).netloc
+
+        with self._lock:
+            if host not in self._hosts:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+
+                self._hosts[host] = HostState(
+                    session,
+                    TokenBucket(self.rate, self.burst) if self.rate else None,
+                    AdaptiveConcurrencyLimiter(self.initial_concurrency, 1, self.max_concurrency,
+                                               latency_target=self.latency_target),
+                    CircuitBreaker(self.failure_threshold, self.reset_timeout)
+                )
+
+            return self._hosts[host]
+
+    def session_for(self, url):
+        """Return the pooled session used for the host of the url."""
+        return self.host_state(url).session
+
+    def reporting_to(self, instrumentation):
+        """Return a view of the client which also counts its requests in instrumentation.
+
+        The view shares the sessions and limits of the client, so runs
+        sharing one client each get the counts of their own requests.
+        """
+        return ReportingClient(self, instrumentation)
+
+    def request(self, method, url, instrumentation=None, **kwargs):
+        """Send a request through the limits of its host, retrying failures.
+
+        While the circuit of the host is open the request keeps waiting for
+        it to close and probing the host again, so an outage pauses the
+        caller instead of failing it (for at most max_outage seconds).
+
+        Parameters
+        ----------
+        method : string
+            HTTP method.
+        url : string
+            URL of the request.
+        instrumentation : Instrumentation
+            If set, receives the counts of this request prefixed with 'http_'.
+        kwargs
+            Forwarded to requests.Session.request.
+
+        Returns
+        -------
+        The requests.Response. After the last retry an error response is
+        returned as is and a connection error or timeout is raised.
+        """
+        state = self.host_state(url)
+        kwargs.setdefault('timeout', self.timeout)
+        attempt = 0
+        outage_start = None
+
+        while True:
+            if state.breaker.wait_until_closed():
+                self._count('circuit_pauses', instrumentation)
+
+            if state.bucket is not None:
+                state.bucket.acquire()
+
+            state.limiter.acquire()
+            start = time.monotonic()
+            response = None
+            error = None
+            failed = True
+
+            try:
+                response = state.session.request(method, url, **kwargs)
+                failed = response.status_code in RETRY_STATUS_CODES
+            except RETRY_EXCEPTIONS as exception:
+                error = exception
+                if isinstance(exception, requests.Timeout):
+                    self._count('timeouts', instrumentation)
+            finally:
+                # Release the slot on every path, including errors which are not retried.
+                state.limiter.release(time.monotonic() - start, not failed)
+                self._count('requests', instrumentation)
+
+            if not failed:
+                state.breaker.record_success()
+                return response
+
+            state.breaker.record_failure()
+            self._count('failures', instrumentation)
+
+            if state.breaker.is_open:
+                # The host is down: wait for it instead of using up the retries.
+                outage_start = outage_start if outage_start is not None else time.monotonic()
+                if self.max_outage is None or time.monotonic() - outage_start < self.max_outage:
+                    continue
+            elif attempt < self.retries:
+                self._count('retries', instrumentation)
+                time.sleep(self._retry_delay(attempt, response))
+                attempt += 1
+                continue
+
+            if response is not None:
+                return response
+            raise error
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def close(self):
+        """Close all sessions."""
+        with self._lock:
+            for state in self._hosts.values():
+                state.session.close()
+            self._hosts.clear()
+
+    def _retry_delay(self, attempt, response):
+        # Honour Retry-After in seconds, otherwise use jittered exponential backoff.
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after is not None and retry_after.isdigit():
+            return float(retry_after)
+
+        with self._lock:
+            jitter = self._random.uniform(0.5, 1.5)
+        return self.backoff * 2 ** attempt * jitter
+
+    def _count(self, name, instrumentation):
+        with self._lock:
+            self.stats[name] += 1
+        if instrumentation is not None:
+            instrumentation.count('http_' + name)
+
+
+class ReportingClient:
+    """post and get of an HttpClient, counting every request in an Instrumentation."""
+
+    def __init__(self, client, instrumentation):
+        self.client = client
+        self.instrumentation = instrumentation
+
+    def post(self, url, **kwargs):
+        return self.client.request('POST', url, instrumentation=self.instrumentation, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.client.request('GET', url, instrumentation=self.instrumentation, **kwargs)
@@ -0,0 +1,101 @@
+import bisect
+
+import numpy as np
+
+from ParetoArchive import ParetoArchive
+
+# Worst (ff_amp_probability, ff_toxicity) point that still counts, i.e. no
+# AMP probability and the highest ToxinPred SVM score considered.
+DEFAULT_REFERENCE = (0.0, -1.5)
+
+
+def hypervolume(objectives, reference=DEFAULT_REFERENCE):
+    """Area dominated by two-objective points and bounded by a reference point.
+
+    Both objectives are maximized. Points are sorted by decreasing first
+    objective; the running maximum of the second objective then gives the
+    height of the dominated area over every interval of the first one, so
+    the points do not have to be non-dominated. Runs in O(n log n).
+
+    Parameters
+    ----------
+    objectives : numpy.ndarray
+        Array of shape (n, 2), e.g. (ff_amp_probability, ff_toxicity) rows.
+    reference : tuple
+        Reference point, dominated by every point that contributes to the area.
+
+    Returns
+    -------
+    Hypervolume as a float.
+    """
+    objectives = np.asarray(objectives, dtype=float).reshape(-1, 2)
+    objectives = objectives[(objectives[:, 0] > reference[0]) & (objectives[:, 1] > reference[1])]
+
+    if len(objectives) == 0:
+        return 0.0
+
+    objectives = objectives[np.argsort(-objectives[:, 0], kind='stable')]
+    heights = np.maximum.accumulate(objectives[:, 1]) - reference[1]
+    widths = objectives[:, 0] - np.append(objectives[1:, 0], reference[0])
+
+    return float(np.sum(widths * heights))
+
+
+class HypervolumeArchive(ParetoArchive):
+    """ParetoArchive which keeps the hypervolume of its solutions up to date.
+
+    The area a new solution adds is the part of its box (spanned with the
+    reference point) not yet covered by the archive. Walking from the new
+    solution towards lower ff_amp_probability, the covered height of the
+    archive staircase only grows, so the walk stops one step after the run
+    of solutions the new one dominates. Since every solution is pruned at
+    most once, insertion stays O(log n) amortized.
+    """
+
+    def __init__(self, reference=DEFAULT_REFERENCE):
+        """Create an empty archive.
+
+        Parameters
+        ----------
+        reference : tuple
+            Reference point of the hypervolume.
+        """
+        super().__init__()
+        self.reference = tuple(reference)
+        self.hypervolume = 0.0
+
+    def insert(self, peptide_string, ff_amp_probability, ff_toxicity):
+        if self.is_dominated(ff_amp_probability, ff_toxicity):
+            return False
+
+        self.hypervolume += self._gain(ff_amp_probability, ff_toxicity)
+
+        return super().insert(peptide_string, ff_amp_probability, ff_toxicity)
+
+    def _gain(self, ff_amp_probability, ff_toxicity):
+        # Area dominated by the new point but not by the archive.
+        reference_amp_probability, reference_toxicity = self.reference
+
+        if ff_amp_probability <= reference_amp_probability or ff_toxicity <= reference_toxicity:
+            return 0.0
+
+        gain = 0.0
+        right = ff_amp_probability
+        index = bisect.bisect_left(self._amp_probabilities, ff_amp_probability)
+
+        while right > reference_amp_probability:
+            # Between the previous solution and `right` the archive covers up to the toxicity of solution `index`.
+            covered = -self._negated_toxicities[index] if index < len(self) else reference_toxicity
+            covered = max(covered, reference_toxicity)
+
+            if covered >= ff_toxicity:
+                break
+
+            left = self._amp_probabilities[index - 1] if index > 0 else reference_amp_probability
+            left = max(left, reference_amp_probability)
+
+            gain += (right - left) * (ff_toxicity - covered)
+            right = left
+            index -= 1
+
+        return gain
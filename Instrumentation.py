@@ -0,0 +1,110 @@
+import contextlib
+import cProfile
+import json
+import threading
+import time
+from collections import Counter, defaultdict
+
+
+class Instrumentation:
+    """Timers, counters and metric sinks of an NSGA_II run.
+
+    Code under measurement wraps its phases in timer(name) and reports
+    events with count(name). At the end of every generation NSGA_II calls
+    end_generation, which combines the generation's timings and counters
+    with the run metrics into one record, appends it to the JSON lines sink
+    and passes it to every callback. Timings are then reset, so every
+    record shows where the seconds of that generation went.
+
+    Timers and counters may be used from several threads at once; timings
+    of concurrent work (e.g. remote chunks) are summed.
+    """
+
+    def __init__(self, sink_path=None, callbacks=(), profile_path=None):
+        """Configure the outputs.
+
+        Parameters
+        ----------
+        sink_path : string
+            Path of a JSON lines file receiving one record per generation.
+        callbacks : list
+            Functions called with every generation record (a dictionary).
+        profile_path : string
+            If set, runs are profiled with cProfile and the statistics are
+            written to this path (readable with pstats).
+        """
+        self.sink_path = sink_path
+        self.callbacks = list(callbacks)
+        self.profile_path = profile_path
+
+        self.timings = defaultdict(float)
+        self.counters = Counter()
+        self.records = []
+
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def timer(self, name):
+        """Add the time spent in the with block to the timing `name`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.timings[name] += elapsed
+
+    def count(self, name, value=1):
+        """Increase the counter `name`."""
+        with self._lock:
+            self.counters[name] += value
+
+    def end_generation(self, generation_number, metrics=None):
+        """Emit the record of a finished generation and reset the timings.
+
+        Parameters
+        ----------
+        generation_number : int
+            Number of the finished generation (or merged batch in steady-state mode).
+        metrics : dict
+            Further run metrics to include in the record.
+
+        Returns
+        -------
+        The record dictionary.
+        """
+        with self._lock:
+            record = {
+                'generation': generation_number,
+                'time': time.time(),
+                'timings': dict(self.timings),
+                'counters': dict(self.counters),
+            }
+            self.timings.clear()
+
+        record.update(metrics or {})
+        self.records.append(record)
+
+        if self.sink_path is not None:
+            with open(self.sink_path, 'a') as file:
+                file.write(json.dumps(record) + '\n')
+
+        for callback in self.callbacks:
+            callback(record)
+
+        return record
+
+    @contextlib.contextmanager
+    def profiling(self):
+        """Profile the with block with cProfile if profile_path is set."""
+        if self.profile_path is None:
+            yield
+            return
+
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            profile.dump_stats(self.profile_path)
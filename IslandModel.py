@@ -0,0 +1,240 @@
+import multiprocessing
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import wait
+
+import numpy as np
+
+import ParetoRanking
+from EvaluationEngine import EvaluationEngine
+from Evaluators import CoalescingEvaluator, Evaluator
+from FitnessCache import FitnessCache
+from PeptideEvolutionNSGAII import NSGA_II
+from Population import Population
+
+
+class PipeEvaluator(Evaluator):
+    """Evaluator of an island process, forwarding peptides to the IslandModel process."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def evaluate(self, peptide_strings, instrumentation=None):
+        # Remote timings and counts are recorded by the IslandModel process.
+        self.connection.send(('evaluate', list(peptide_strings)))
+        scores = self.connection.recv()
+
+        # Errors of the shared evaluator are raised inside the island.
+        if isinstance(scores, Exception):
+            raise scores
+
+        return scores
+
+
+def _population_rows(population, indices=None):
+    # Picklable (peptide_strings, ff_amp_probability, ff_toxicity) columns of a population.
+    if indices is not None:
+        population = population.take(indices)
+    return population.peptide_strings(), population.ff_amp_probability.tolist(), population.ff_toxicity.tolist()
+
+
+def _run_island(connection, settings, migration_interval, migration_size):
+    # Body of an island process: a whole NSGA_II run which stops every
+    # migration_interval generations to swap elites with its neighbour.
+    nsga = NSGA_II(evaluator=PipeEvaluator(connection), **settings)
+
+    population = nsga.initialize_population()
+
+    for generation_number in range(1, nsga.num_generations + 1):
+        population = nsga.evolve_generation(population)
+
+        if migration_interval and generation_number % migration_interval == 0 \
+                and generation_number < nsga.num_generations:
+            elites = ParetoRanking.select_survivors(population.rank, population.distance, migration_size)
+            connection.send(('migrate', _population_rows(population, elites)))
+
+            immigrants = Population.from_strings(*connection.recv())
+            population = nsga.merge_offspring(population, immigrants)
+
+    connection.send(('done', (
+        _population_rows(population),
+        nsga.pareto_archive.front(),
+        dict(nsga.mutation_counts),
+        dict(nsga.evaluation_counts),
+    )))
+    connection.close()
+
+
+class IslandModel:
+    """Run several NSGA_II populations in parallel processes.
+
+    Every island is an independent NSGA_II with its own seed and optionally
+    its own mutation_probability and penalty_function_reducer. Every
+    migration_interval generations each island sends its best
+    migration_size solutions to the next island in a ring.
+
+    Islands do not score peptides themselves. They send their cache misses
+    through a pipe to this process, which serves them from one shared
+    FitnessCache and one shared evaluator behind a CoalescingEvaluator, so a
+    peptide found by several islands is scored only once, also when they
+    miss it at the same time, and all islands share the remote concurrency.
+    """
+
+    def __init__(self,
+                 num_islands,
+                 migration_interval,
+                 migration_size,
+                 fitness_cache=None,
+                 evaluator=None,
+                 seed=None,
+                 island_settings=None,
+                 **settings):
+        """Save the forwarded arguments.
+
+        Parameters
+        ----------
+        num_islands : int
+            Number of islands (processes).
+        migration_interval : int
+            Number of generations between migrations, 0 disables migration.
+        migration_size : int
+            Number of elite solutions each island sends at a migration.
+        fitness_cache : FitnessCache
+            Cache shared by all islands. If None, an in-memory cache is used.
+        evaluator : Evaluator
+            Evaluator shared by all islands. If None, an EvaluationEngine querying
+            the live web services is used.
+        seed : int
+            Seed from which the seeds of all islands are derived.
+        island_settings : list
+            Optional list of num_islands dictionaries with NSGA_II arguments
+            overriding settings for a single island, e.g. {'mutation_probability': 0.5}.
+        settings
+            NSGA_II arguments shared by all islands (lowerRange, upperRange,
+            population_size, ...).
+        """
+        self.num_islands = num_islands
+        self.migration_interval = migration_interval
+        self.migration_size = migration_size
+        self.island_settings = island_settings if island_settings is not None else [{}] * num_islands
+        self.settings = settings
+
+        fitness_cache = fitness_cache if fitness_cache is not None else FitnessCache()
+        evaluator = evaluator if evaluator is not None else EvaluationEngine()
+
+        # The NSGA_II of this process only ranks the merged final populations.
+        self.nsga = NSGA_II(fitness_cache=fitness_cache, evaluator=CoalescingEvaluator(evaluator, fitness_cache),
+                            **settings)
+        self.fitness_cache = self.nsga.fitness_cache
+        self.evaluator = self.nsga.evaluator
+        self._lock = threading.Lock()
+
+        self.seeds = np.random.SeedSequence(seed).generate_state(num_islands).tolist()
+
+        # Merged results of all islands. Evaluation counts of this process
+        # (self.nsga.evaluation_counts) show what missed the shared cache.
+        self.pareto_archive = self.nsga.pareto_archive
+        self.mutation_counts = self.nsga.mutation_counts
+        self.evaluation_counts = Counter()
+
+    def calculate(self):
+        """Run all islands and rank their merged final populations.
+
+        Returns
+        -------
+        List of pareto fronts, like NSGA_II.calculate.
+        """
+        connections = []
+        processes = []
+
+        for island_index in range(self.num_islands):
+            settings = dict(self.settings, seed=self.seeds[island_index], **self.island_settings[island_index])
+            parent_connection, child_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_run_island,
+                args=(child_connection, settings, self.migration_interval, self.migration_size),
+                daemon=True
+            )
+            process.start()
+            child_connection.close()
+
+            connections.append(parent_connection)
+            processes.append(process)
+
+        try:
+            results = self._serve_islands(connections)
+        finally:
+            for process in processes:
+                process.join(timeout=1)
+                if process.is_alive():
+                    process.terminate()
+
+        populations = []
+
+        for rows, archive, mutation_counts, evaluation_counts in results:
+            populations.append(Population.from_strings(*rows))
+            self.pareto_archive.insert_many(archive)
+            self.mutation_counts.update(mutation_counts)
+            self.evaluation_counts.update(evaluation_counts)
+
+        population = populations[0]
+        for other in populations[1:]:
+            population = population.concatenate(other)
+
+        self.nsga.print_statistics()
+        print('Island evaluations: {}'.format(dict(self.evaluation_counts)))
+
+        return self.nsga.pareto_fronts(population)
+
+    def _serve_islands(self, connections):
+        # Answer island messages until every island is done. Evaluation
+        # requests are served from a thread pool so islands are scored
+        # concurrently; migrations wait until every island has sent its elites.
+        island_indices = {connection: island_index for island_index, connection in enumerate(connections)}
+        running = list(connections)
+        results = [None] * len(connections)
+        emigrants = {}
+
+        with ThreadPoolExecutor(max_workers=len(connections)) as executor:
+            while running:
+                for connection in wait(running):
+                    island_index = island_indices[connection]
+
+                    try:
+                        kind, payload = connection.recv()
+                    except EOFError:
+                        raise RuntimeError('Island {} exited unexpectedly'.format(island_index))
+
+                    if kind == 'evaluate':
+                        executor.submit(self._serve_evaluation, connection, payload)
+                    elif kind == 'migrate':
+                        emigrants[island_index] = payload
+                        if len(emigrants) == len(connections):
+                            # Ring topology: island i receives the elites of island i - 1.
+                            for receiver, receiver_connection in enumerate(connections):
+                                receiver_connection.send(emigrants[(receiver - 1) % len(connections)])
+                            emigrants = {}
+                    elif kind == 'done':
+                        results[island_index] = payload
+                        running.remove(connection)
+
+        return results
+
+    def _serve_evaluation(self, connection, peptide_strings):
+        # Score peptides for an island from the shared cache and evaluator.
+        try:
+            with self._lock:
+                amp_probabilities, toxicities, misses = self.nsga.look_up_scores(peptide_strings)
+
+            if misses:
+                scores = self.nsga.score_remotely(misses)
+                with self._lock:
+                    self.nsga.record_scores(scores, amp_probabilities, toxicities)
+
+            connection.send({
+                peptide_string: (amp_probabilities[peptide_string],) + tuple(toxicities[peptide_string])
+                for peptide_string in peptide_strings
+            })
+        except Exception as error:
+            connection.send(error)
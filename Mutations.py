@@ -1,28 +1,93 @@
-import random
+import numpy as np
 from Constants import AMINO_ACIDS
 
-def add_amino_acid(peptide):
-    index = random.randint(0, len(peptide))
-    new_amino_acid = random.choice(AMINO_ACIDS)
-    peptide.insert(index, new_amino_acid)
+# Operator codes used by the batched mutation.
+ADD_AMINO_ACID = 0
+DELETE_AMINO_ACID = 1
+SWAP_AMINO_ACIDS = 2
+EXCHANGE_AMINO_ACID = 3
 
-    return peptide
+MUTATION_NAMES = ('add_amino_acid', 'delete_amino_acid', 'swap_amino_acids', 'exchange_amino_acid')
 
-def delete_amino_acid(peptide):
-    index = random.randint(0, len(peptide) - 1)
-    peptide.pop(index)
 
-    return peptide
+def mutate_batch(sequences, lengths, mask, operators, lowerRange, upperRange, rng):
+    """Mutate many encoded peptides at once.
 
-def swap_amino_acids(peptide):
-    index1, index2 = random.sample(range(len(peptide)), 2)
-    peptide[index1], peptide[index2] = peptide[index2], peptide[index1]
+    Every selected row gets one mutation. Insertions are only applied below
+    upperRange, deletions only above lowerRange and swaps only for peptides
+    with at least two amino acids; otherwise the row gets an exchange instead.
 
-    return peptide
+    Parameters
+    ----------
+    sequences : numpy.ndarray
+        Padded uint8 matrix of amino acid codes (see Population.encode_sequences).
+    lengths : numpy.ndarray
+        Peptide lengths.
+    mask : numpy.ndarray
+        Boolean array, True for the rows to mutate.
+    operators : numpy.ndarray
+        Operator code (ADD_AMINO_ACID, ...) for every row.
+    lowerRange : int
+        Lower limit of sequence length.
+    upperRange : int
+        Upper limit of sequence length.
+    rng : numpy.random.Generator
+        Source of randomness.
 
-def exchange_amino_acid(peptide):
-    index = random.randint(0, len(peptide) - 1)
-    new_amino_acid = random.choice(AMINO_ACIDS)
-    peptide[index] = new_amino_acid
+    Returns
+    -------
+    Tuple (sequences, lengths, operators).
+        New arrays; operators holds the operator applied to every row.
+    """
+    n, width = sequences.shape
 
-    return peptide
\ No newline at end of file
+    # Make room for insertions.
+    mutated = np.zeros((n, max(width, upperRange)), dtype=np.uint8)
+    mutated[:, :width] = sequences
+    lengths = np.array(lengths, dtype=np.int64)
+    operators = np.array(operators, dtype=np.int64)
+
+    # Fall back to an exchange when the chosen operator would break the range.
+    operators[(operators == ADD_AMINO_ACID) & (lengths >= upperRange)] = EXCHANGE_AMINO_ACID
+    operators[(operators == DELETE_AMINO_ACID) & (lengths <= lowerRange)] = EXCHANGE_AMINO_ACID
+    operators[(operators == SWAP_AMINO_ACIDS) & (lengths < 2)] = EXCHANGE_AMINO_ACID
+    mask = mask & (lengths > 0)
+
+    columns = np.arange(mutated.shape[1])[None, :]
+
+    rows = np.flatnonzero(mask & (operators == ADD_AMINO_ACID))
+    if rows.size:
+        index = rng.integers(0, lengths[rows] + 1)[:, None]
+        new_amino_acid = rng.integers(1, len(AMINO_ACIDS) + 1, rows.size, dtype=np.uint8)[:, None]
+        shifted_right = np.roll(mutated[rows], 1, axis=1)
+        mutated[rows] = np.where(columns < index, mutated[rows], np.where(columns == index, new_amino_acid, shifted_right))
+        lengths[rows] += 1
+
+    rows = np.flatnonzero(mask & (operators == DELETE_AMINO_ACID))
+    if rows.size:
+        index = rng.integers(0, lengths[rows])[:, None]
+        shifted_left = np.roll(mutated[rows], -1, axis=1)
+        shifted_left[:, -1] = 0
+        mutated[rows] = np.where(columns < index, mutated[rows], shifted_left)
+        lengths[rows] -= 1
+
+    rows = np.flatnonzero(mask & (operators == SWAP_AMINO_ACIDS))
+    if rows.size:
+        # Draw two distinct positions.
+        index1 = rng.integers(0, lengths[rows])
+        index2 = rng.integers(0, lengths[rows] - 1)
+        index2 += index2 >= index1
+        mutated[rows, index1], mutated[rows, index2] = mutated[rows, index2], mutated[rows, index1]
+
+    rows = np.flatnonzero(mask & (operators == EXCHANGE_AMINO_ACID))
+    if rows.size:
+        index = rng.integers(0, lengths[rows])
+        mutated[rows, index] = rng.integers(1, len(AMINO_ACIDS) + 1, rows.size, dtype=np.uint8)
+
+    return mutated, lengths, operators
+
+
+def count_mutations(mask, operators):
+    """Return a dictionary with the number of applied mutations per operator name."""
+    counts = np.bincount(operators[mask], minlength=len(MUTATION_NAMES))
+    return {name: int(count) for name, count in zip(MUTATION_NAMES, counts)}
@@ -0,0 +1,70 @@
+import numpy as np
+
+
+def tournament_select(rank, distance, num_winners, tournament_size, rng):
+    """Run many tournaments at once.
+
+    Contestants of all tournaments are drawn as one (num_winners, tournament_size)
+    index array. The lowest rank wins, ties are broken by the highest crowding
+    distance and then by the order of drawing.
+
+    Parameters
+    ----------
+    rank : numpy.ndarray
+        Pareto front index of every solution.
+    distance : numpy.ndarray
+        Crowding distance of every solution.
+    num_winners : int
+        Number of tournaments.
+    tournament_size : int
+        Number of contestants per tournament.
+    rng : numpy.random.Generator
+        Source of randomness.
+
+    Returns
+    -------
+    numpy.ndarray of winner indices.
+    """
+    contestants = rng.integers(0, len(rank), (num_winners, tournament_size))
+    contestant_rank = rank[contestants]
+
+    # Only contestants with the best rank compete on distance; argmax
+    # returns the first of equal values.
+    best_rank = contestant_rank.min(axis=1, keepdims=True)
+    contestant_distance = np.where(contestant_rank == best_rank, distance[contestants], -np.inf)
+    winners = contestant_distance.argmax(axis=1)
+
+    return contestants[np.arange(num_winners), winners]
+
+
+def one_point_crossover(sequences, lengths, first_parents, second_parents, rng):
+    """Perform one-point crossover for many pairs of parents at once.
+
+    A child takes the first parent's amino acids before a random recombination
+    index, which is smaller than the first parent's length, and the second
+    parent's amino acids from the index on.
+
+    Parameters
+    ----------
+    sequences : numpy.ndarray
+        Padded uint8 matrix of amino acid codes.
+    lengths : numpy.ndarray
+        Peptide lengths.
+    first_parents : numpy.ndarray
+        Row indices of the first parents.
+    second_parents : numpy.ndarray
+        Row indices of the second parents.
+    rng : numpy.random.Generator
+        Source of randomness.
+
+    Returns
+    -------
+    Tuple (children, child_lengths).
+    """
+    recombination_index = rng.integers(0, np.maximum(lengths[first_parents], 1))
+
+    take_first = np.arange(sequences.shape[1])[None, :] < recombination_index[:, None]
+    children = np.where(take_first, sequences[first_parents], sequences[second_parents])
+    child_lengths = np.maximum(recombination_index, lengths[second_parents])
+
+    return children, child_lengths
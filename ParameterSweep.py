@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+import FitnessFunctionScraper
+from EvaluationEngine import EvaluationEngine
+from Evaluators import CoalescingEvaluator
+from FitnessCache import FitnessCache
+from Hypervolume import hypervolume
+from PeptideEvolutionNSGAII import NSGA_II
+
+# NSGA_II arguments which can be swept.
+SWEPT_PARAMETERS = (
+    'population_size',
+    'offspring_size',
+    'mutation_probability',
+    'num_solutions_tournament',
+    'penalty_function_reducer',
+)
+
+RESULT_COLUMNS = ('run', 'seed') + SWEPT_PARAMETERS + (
+    'generations', 'submitted', 'hypervolume', 'front_hypervolume', 'front_size', 'seconds', 'front'
+)
+
+
+def grid_configurations(grid):
+    """Return every combination of the values in grid.
+
+    Parameters
+    ----------
+    grid : dict
+        Parameter name -> list of values.
+
+    Returns
+    -------
+    List of dictionaries parameter name -> value.
+    """
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def random_configurations(space, count, rng):
+    """Sample configurations from a parameter space.
+
+    Parameters
+    ----------
+    space : dict
+        Parameter name -> list of values to choose from, or (low, high) tuple
+        sampled uniformly (as integers when both bounds are integers).
+    count : int
+        Number of configurations.
+    rng : numpy.random.Generator
+        Random number generator.
+
+    Returns
+    -------
+    List of dictionaries parameter name -> value.
+    """
+    configurations = []
+
+    for _ in range(count):
+        configuration = {}
+        for name, values in space.items():
+            if isinstance(values, tuple):
+                low, high = values
+                if isinstance(low, int) and isinstance(high, int):
+                    configuration[name] = int(rng.integers(low, high + 1))
+                else:
+                    configuration[name] = float(rng.uniform(low, high))
+            else:
+                configuration[name] = values[int(rng.integers(len(values)))]
+        configurations.append(configuration)
+
+    return configurations
+
+
+class ParameterSweep:
+    """Run many NSGA_II configurations concurrently and tabulate their results.
+
+    Every run is a separate NSGA_II with its own population, random number
+    generator and counters. All runs share one FitnessCache and one
+    evaluator behind a CoalescingEvaluator, so a peptide found by several
+    runs is scored only once, also when they request it at the same time.
+    Each finished run appends one row to a CSV results table, so the table
+    of an interrupted overnight sweep still holds every completed run.
+    """
+
+    def __init__(self,
+                 configurations,
+                 output_path='sweep_results.csv',
+                 seeds=(0,),
+                 max_parallel=4,
+                 fitness_cache=None,
+                 evaluator=None,
+                 **settings):
+        """Save the forwarded arguments.
+
+        Parameters
+        ----------
+        configurations : list
+            Dictionaries of swept NSGA_II arguments (see grid_configurations).
+        output_path : string
+            Path of the CSV results table. Rows are appended.
+        seeds : list
+            Every configuration is run once per seed.
+        max_parallel : int
+            Maximum number of runs at the same time.
+        fitness_cache : FitnessCache
+            Cache shared by all runs. If None, an in-memory cache is used.
+        evaluator : Evaluator
+            Evaluator shared by all runs. If None, an EvaluationEngine querying
+            the live web services is used.
+        settings
+            NSGA_II arguments common to all runs (lowerRange, upperRange,
+            num_generations, defaults of the swept arguments, ...).
+        """
+        self.configurations = list(configurations)
+        self.output_path = output_path
+        self.seeds = list(seeds)
+        self.max_parallel = max_parallel
+        self.fitness_cache = fitness_cache if fitness_cache is not None else FitnessCache()
+        self.evaluator = CoalescingEvaluator(evaluator if evaluator is not None else EvaluationEngine(),
+                                             self.fitness_cache)
+        self.settings = settings
+
+        self._lock = threading.Lock()
+
+    def run(self):
+        """Run all configurations with all seeds.
+
+        Returns
+        -------
+        List of result rows (dictionaries with RESULT_COLUMNS keys) in completion order.
+        """
+        runs = [
+            (run_index, configuration, seed) for run_index, (configuration, seed)
+            in enumerate(itertools.product(self.configurations, self.seeds))
+        ]
+        rows = []
+
+        with ThreadPoolExecutor(max_workers=self.max_parallel) as executor:
+            futures = [executor.submit(self.run_configuration, *run) for run in runs]
+
+            for future in as_completed(futures):
+                row = future.result()
+                rows.append(row)
+                self._write_row(row)
+                print('Run {run} finished: hypervolume {hypervolume:.4f}, {submitted} evaluations'.format(**row))
+
+        return rows
+
+    def run_configuration(self, run_index, configuration, seed):
+        """Run a single configuration and return its result row."""
+        settings = dict(self.settings, **configuration)
+        GA = NSGA_II(fitness_cache=self.fitness_cache, evaluator=self.evaluator, seed=seed, **settings)
+
+        start = time.perf_counter()
+        pareto_fronts = GA.calculate()
+        seconds = time.perf_counter() - start
+
+        front = [(peptide_string, ff_amp_probability, ff_toxicity)
+                 for _, peptide_string, ff_amp_probability, ff_toxicity in pareto_fronts[0]]
+
+        return dict(
+            {name: settings.get(name) for name in SWEPT_PARAMETERS},
+            run=run_index,
+            seed=seed,
+            generations=len(GA.hypervolume_history),
+            submitted=GA.evaluation_counts['submitted'],
+            hypervolume=GA.pareto_archive.hypervolume,
+            front_hypervolume=hypervolume([objectives for _, *objectives in front]),
+            front_size=len(front),
+            seconds=round(seconds, 3),
+            front=json.dumps(front)
+        )
+
+    def _write_row(self, row):
+        with self._lock:
+            new_file = not os.path.exists(self.output_path) or os.path.getsize(self.output_path) == 0
+
+            with open(self.output_path, 'a', newline='') as file:
+                writer = csv.DictWriter(file, fieldnames=RESULT_COLUMNS)
+                if new_file:
+                    writer.writeheader()
+                writer.writerow(row)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run a grid or random sample of NSGA_II configurations.')
+    parser.add_argument('--population-size', type=int, nargs='+', default=[70])
+    parser.add_argument('--offspring-size', type=int, nargs='+', default=[20])
+    parser.add_argument('--mutation-probability', type=float, nargs='+', default=[0.3])
+    parser.add_argument('--num-solutions-tournament', type=int, nargs='+', default=[5])
+    parser.add_argument('--penalty-function-reducer', type=float, nargs='+', default=[0.7])
+    parser.add_argument('--samples', type=int, help='Run this many random combinations instead of the full grid.')
+    parser.add_argument('--seeds', type=int, nargs='+', default=[0])
+    parser.add_argument('--generations', type=int, default=30)
+    parser.add_argument('--lower-range', type=int, default=8)
+    parser.add_argument('--upper-range', type=int, default=19)
+    parser.add_argument('--parallel', type=int, default=4, help='Number of runs at the same time.')
+    parser.add_argument('--output', default='sweep_results.csv')
+    parser.add_argument('--cache', default='fitness_cache.db', help='Path of the shared SQLite fitness cache.')
+    parser.add_argument('--camp-url', default=FitnessFunctionScraper.CAMP_URL)
+    parser.add_argument('--toxinpred-url', default=FitnessFunctionScraper.TOXINPRED_URL)
+    arguments = parser.parse_args()
+
+    grid = {name: getattr(arguments, name) for name in SWEPT_PARAMETERS}
+
+    if arguments.samples:
+        configurations = random_configurations(grid, arguments.samples, np.random.default_rng(arguments.seeds[0]))
+    else:
+        configurations = grid_configurations(grid)
+
+    sweep = ParameterSweep(
+        configurations,
+        output_path=arguments.output,
+        seeds=arguments.seeds,
+        max_parallel=arguments.parallel,
+        fitness_cache=FitnessCache(arguments.cache),
+        evaluator=EvaluationEngine(camp_url=arguments.camp_url, toxinpred_url=arguments.toxinpred_url),
+        lowerRange=arguments.lower_range,
+        upperRange=arguments.upper_range,
+        num_generations=arguments.generations
+    )
+    sweep.run()
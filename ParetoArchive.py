@@ -0,0 +1,93 @@
+import bisect
+
+import numpy as np
+
+
+class ParetoArchive:
+    """Unbounded archive of all non-dominated peptides ever evaluated.
+
+    Both objectives (ff_amp_probability and ff_toxicity) are maximized.
+    Archived solutions are kept sorted by increasing ff_amp_probability;
+    since none of them dominates another, ff_toxicity strictly decreases
+    along the same order. A new solution is therefore checked against a
+    single neighbour, and the solutions it dominates form one contiguous
+    run, both found by binary search.
+    """
+
+    def __init__(self):
+        self._amp_probabilities = []
+        # Negated ff_toxicity, increasing along the archive.
+        self._negated_toxicities = []
+        self._peptide_strings = []
+
+    def __len__(self):
+        return len(self._peptide_strings)
+
+    def __contains__(self, peptide_string):
+        return peptide_string in self._peptide_strings
+
+    def is_dominated(self, ff_amp_probability, ff_toxicity):
+        """Return True if an archived solution is at least as good in both objectives."""
+        index = bisect.bisect_left(self._amp_probabilities, ff_amp_probability)
+
+        # Among solutions with at least this AMP probability, the first one has the highest toxicity score.
+        return index < len(self) and -self._negated_toxicities[index] >= ff_toxicity
+
+    def insert(self, peptide_string, ff_amp_probability, ff_toxicity):
+        """Add a solution and prune the archived solutions it dominates.
+
+        Parameters
+        ----------
+        peptide_string : string
+            Peptide label.
+        ff_amp_probability : float
+            The possibility that antimicrobial peptide have antimicrobial properties.
+        ff_toxicity : float
+            The SVM score of toxicity of the peptide multiplied by -1.
+
+        Returns
+        -------
+        True if the solution entered the archive, False if it was dominated
+        by (or equal to) an archived solution.
+        """
+        if self.is_dominated(ff_amp_probability, ff_toxicity):
+            return False
+
+        # Dominated solutions have no higher AMP probability and no higher
+        # toxicity score, i.e. they lie between these two positions.
+        first = bisect.bisect_left(self._negated_toxicities, -ff_toxicity)
+        last = bisect.bisect_right(self._amp_probabilities, ff_amp_probability)
+
+        self._amp_probabilities[first:last] = [ff_amp_probability]
+        self._negated_toxicities[first:last] = [-ff_toxicity]
+        self._peptide_strings[first:last] = [peptide_string]
+
+        return True
+
+    def insert_many(self, evaluated_peptides):
+        """Insert (peptide_string, ff_amp_probability, ff_toxicity) tuples.
+
+        Returns
+        -------
+        Number of solutions that entered the archive.
+        """
+        return sum(self.insert(peptide_string, ff_amp_probability, ff_toxicity)
+                   for peptide_string, ff_amp_probability, ff_toxicity in evaluated_peptides)
+
+    def front(self):
+        """Return the archived solutions as (peptide_string, ff_amp_probability, ff_toxicity) tuples.
+
+        Solutions are sorted by increasing ff_amp_probability.
+        """
+        return [
+            (peptide_string, ff_amp_probability, -negated_toxicity)
+            for peptide_string, ff_amp_probability, negated_toxicity
+            in zip(self._peptide_strings, self._amp_probabilities, self._negated_toxicities)
+        ]
+
+    def objectives(self):
+        """Return an (n, 2) array with ff_amp_probability and ff_toxicity columns."""
+        return np.column_stack((self._amp_probabilities, np.negative(self._negated_toxicities))).reshape(-1, 2)
+
+    def peptide_strings(self):
+        return list(self._peptide_strings)
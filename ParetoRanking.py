@@ -0,0 +1,354 @@
+import bisect
+
+import numpy as np
+
+# Below this many solutions the tie-aware sweep, a Python loop over blocks of
+# equal objective values, is slower than the vectorized domination matrix
+# (measured with `Benchmarks.py non_dominated_sort` on rounded objectives).
+TIED_SWEEP_MIN_SIZE = 1500
+
+
+def domination_matrices(objectives):
+    """Compute pairwise domination between all solutions in one batch.
+
+    All objectives are maximized.
+
+    Parameters
+    ----------
+    objectives : numpy.ndarray
+        Array of shape (n, m), one row of objective values per solution.
+
+    Returns
+    -------
+    Tuple (dominates, strongly_dominates) of boolean arrays of shape (n, n).
+        dominates[i, j] is True if solution i is at least as good as j in all
+        objectives and better in at least one. strongly_dominates[i, j] is
+        True if solution i is better than j in all objectives.
+    """
+    objectives = np.asarray(objectives, dtype=float)
+    n, m = objectives.shape
+
+    all_greater_equal = np.ones((n, n), dtype=bool)
+    any_greater = np.zeros((n, n), dtype=bool)
+    all_greater = np.ones((n, n), dtype=bool)
+
+    for column in objectives.T:
+        greater = column[:, None] > column[None, :]
+        all_greater_equal &= column[:, None] >= column[None, :]
+        any_greater |= greater
+        all_greater &= greater
+
+    return all_greater_equal & any_greater, all_greater
+
+
+def matrix_non_dominated_sort(objectives):
+    """Divide solutions into pareto fronts using a batched domination matrix.
+
+    Follows the front peeling of NSGA_II.perform_non_dominated_sort: a
+    solution waits for as many solutions as strongly dominate it and is
+    released by every solution on an earlier front which dominates it.
+
+    Parameters
+    ----------
+    objectives : numpy.ndarray
+        Array of shape (n, m), one row of objective values per solution.
+
+    Returns
+    -------
+    Tuple (fronts, ranks).
+        fronts is a list of index arrays, ranks[i] is the front index of solution i.
+    """
+    n = len(objectives)
+    ranks = np.full(n, -1, dtype=int)
+    fronts = []
+
+    if n == 0:
+        return fronts, ranks
+
+    dominates, strongly_dominates = domination_matrices(objectives)
+
+    # domination_count[i] is the number of solutions that strongly dominate solution i.
+    domination_count = strongly_dominates.sum(axis=0)
+    front = np.flatnonzero(domination_count == 0)
+
+    while front.size > 0:
+        ranks[front] = len(fronts)
+        fronts.append(front)
+
+        # Every solution on the current front releases the solutions it dominates.
+        # A solution joins the next front when its count drops to zero.
+        released = dominates[front].sum(axis=0)
+        front = np.flatnonzero((domination_count >= 1) & (domination_count - released <= 0))
+        domination_count = domination_count - released
+
+    return fronts, ranks
+
+
+def sweep_non_dominated_sort(objectives):
+    """Divide solutions into pareto fronts for two objectives without a domination matrix.
+
+    Gives the same fronts as matrix_non_dominated_sort, also when objectives
+    are tied. Solutions without ties are swept by staircase_sort in
+    O(n log n); tied inputs are swept by tied_sweep_sort.
+
+    Parameters
+    ----------
+    objectives : numpy.ndarray
+        Array of shape (n, 2), one row of objective values per solution.
+
+    Returns
+    -------
+    Tuple (fronts, ranks).
+        fronts is a list of index arrays, ranks[i] is the front index of solution i.
+    """
+    objectives = np.asarray(objectives, dtype=float)
+
+    if len(objectives) == 0:
+        return [], np.full(0, -1, dtype=int)
+
+    if not has_ties(objectives):
+        ranks = staircase_sort(objectives)
+    else:
+        ranks = tied_sweep_sort(objectives)
+
+    return fronts_from_ranks(ranks), ranks
+
+
+def has_ties(objectives):
+    """Return True if any objective has the same value for two solutions."""
+    return any(len(np.unique(column)) < len(column) for column in objectives.T)
+
+
+def staircase_sort(objectives):
+    """Rank solutions without ties in any objective in O(n log n).
+
+    Solutions are swept in decreasing order of the first objective. Within a
+    front the second objective can only grow, so the last solution added to
+    a front is the only one that has to be checked, and fronts are found by
+    binary search over their last solutions.
+
+    Returns
+    -------
+    numpy.ndarray with the front index of every solution.
+    """
+    ranks = np.full(len(objectives), -1, dtype=int)
+    order = np.lexsort((-objectives[:, 1], -objectives[:, 0]))
+
+    # Negated (second, first) objective of the last solution on every front.
+    # The keys are strictly increasing from front to front, and a solution is
+    # dominated by a front exactly when the front's key is smaller than its own.
+    last_keys = []
+
+    for index in order.tolist():
+        key = (-objectives[index, 1], -objectives[index, 0])
+        front = bisect.bisect_left(last_keys, key)
+
+        if front == len(last_keys):
+            last_keys.append(key)
+        else:
+            last_keys[front] = key
+
+        ranks[index] = front
+
+    return ranks
+
+
+def tied_sweep_sort(objectives):
+    """Rank solutions with tied objectives like matrix_non_dominated_sort.
+
+    In the front peeling a solution waits for its S strong dominators but is
+    released by every solution that dominates it, including those tied with
+    it in one objective. It therefore joins the front after the S-th lowest
+    front among all solutions that dominate it, or front 0 if S is 0.
+
+    Identical solutions get the same front, so only distinct solutions are
+    ranked, weighted by their number of copies. They are swept in decreasing
+    order of the first objective; every block with an equal first objective
+    is swept in decreasing order of the second one. The strong dominators
+    of a solution are then the earlier blocks with a greater second
+    objective, and all its dominators are the swept solutions with a second
+    objective at least as large, whose fronts are read from a histogram per
+    second objective value. The objectives are swapped if needed so that
+    the second one has fewer distinct values, which bounds the histogram at
+    (number of fronts) x (distinct values); predictor outputs are rounded,
+    so it stays small.
+
+    Returns
+    -------
+    numpy.ndarray with the front index of every solution.
+    """
+    points, inverse, copies = np.unique(objectives, axis=0, return_inverse=True, return_counts=True)
+    inverse = inverse.reshape(-1)
+
+    if len(np.unique(points[:, 0])) < len(np.unique(points[:, 1])):
+        points = points[:, ::-1]
+
+    # Position of every second objective value in decreasing order, so that
+    # "at least as large" becomes a prefix of the histogram.
+    values, value_index = np.unique(-points[:, 1], return_inverse=True)
+    value_index = value_index.reshape(-1)
+    num_values = len(values)
+
+    # fronts_at_least[v, f]: copies on front f with a second objective at least values[v].
+    fronts_at_least = np.zeros((num_values, 16), dtype=np.int64)
+    # earlier_blocks_at_least[v]: copies in earlier blocks with a second objective at least values[v].
+    earlier_blocks_at_least = np.zeros(num_values + 1, dtype=np.int64)
+
+    ranks = np.zeros(len(points), dtype=int)
+    order = np.lexsort((-points[:, 1], -points[:, 0]))
+    first_objective = points[order, 0]
+    block_starts = np.flatnonzero(np.concatenate(([True], first_objective[1:] != first_objective[:-1])))
+
+    for block_start, block_end in zip(block_starts.tolist(), block_starts[1:].tolist() + [len(order)]):
+        block = order[block_start:block_end].tolist()
+
+        for index in block:
+            value = value_index[index]
+            strong_dominators = earlier_blocks_at_least[value - 1] if value > 0 else 0
+
+            if strong_dominators > 0:
+                dominators_up_to = np.cumsum(fronts_at_least[value])
+                ranks[index] = np.searchsorted(dominators_up_to, strong_dominators) + 1
+
+            if ranks[index] >= fronts_at_least.shape[1]:
+                fronts_at_least = np.pad(fronts_at_least, ((0, 0), (0, fronts_at_least.shape[1])))
+
+            fronts_at_least[value:, ranks[index]] += copies[index]
+
+        for index in block:
+            earlier_blocks_at_least[value_index[index]:num_values] += copies[index]
+
+    return ranks[inverse]
+
+
+def fronts_from_ranks(ranks):
+    """Group solution indices by rank into a list of ascending index arrays."""
+    order = np.argsort(ranks, kind='stable')
+    boundaries = np.flatnonzero(np.diff(ranks[order])) + 1
+    return np.split(order, boundaries) if len(order) else []
+
+
+def non_dominated_sort(objectives):
+    """Divide solutions into pareto fronts with the fastest applicable engine.
+
+    Two objectives without ties are swept by staircase_sort. Tied inputs
+    (e.g. rounded predictor outputs) go to the tie-aware sweep from
+    TIED_SWEEP_MIN_SIZE solutions on and to the domination matrix below
+    that, as does every input with more objectives.
+
+    Parameters
+    ----------
+    objectives : numpy.ndarray
+        Array of shape (n, m), one row of objective values per solution.
+
+    Returns
+    -------
+    Tuple (fronts, ranks).
+        fronts is a list of index arrays, ranks[i] is the front index of solution i.
+    """
+    objectives = np.asarray(objectives, dtype=float)
+
+    if len(objectives) == 0:
+        return [], np.full(0, -1, dtype=int)
+
+    if objectives.shape[1] == 2 and (len(objectives) >= TIED_SWEEP_MIN_SIZE or not has_ties(objectives)):
+        return sweep_non_dominated_sort(objectives)
+
+    return matrix_non_dominated_sort(objectives)
+
+
+def crowding_distances(objectives, ranks):
+    """Calculate crowding distance for all pareto fronts at once.
+
+    Solutions are sorted by (rank, objective) for each objective, so every
+    front ends up as a contiguous block. The first and last solution of a
+    block get infinite distance, the others the normalized distance between
+    their two neighbours.
+
+    Parameters
+    ----------
+    objectives : numpy.ndarray
+        Array of shape (n, m), one row of objective values per solution.
+    ranks : numpy.ndarray
+        Front index of every solution.
+
+    Returns
+    -------
+    numpy.ndarray of crowding distances.
+    """
+    objectives = np.asarray(objectives, dtype=float)
+    ranks = np.asarray(ranks)
+    n = len(ranks)
+    distances = np.zeros(n)
+
+    if n == 0:
+        return distances
+
+    boundary = np.zeros(n, dtype=bool)
+
+    for column in objectives.T:
+        order = np.lexsort((column, ranks))
+        values = column[order]
+
+        # Mark the first and the last solution of every front.
+        front_change = np.diff(ranks[order]) != 0
+        is_first = np.concatenate(([True], front_change))
+        is_last = np.concatenate((front_change, [True]))
+
+        # Range of the objective within every front.
+        front_index = np.cumsum(is_first) - 1
+        value_range = values[is_last] - values[is_first]
+        value_range[value_range <= 0] = 1
+
+        interior = ~(is_first | is_last)
+        neighbour_distance = np.zeros(n)
+        neighbour_distance[1:-1] = values[2:] - values[:-2]
+
+        distances[order[interior]] += neighbour_distance[interior] / value_range[front_index[interior]]
+        boundary[order[~interior]] = True
+
+    # First and last solution in the sorted arrays have infinite
+    # crowding distance because they only have one neighbour.
+    distances[boundary] = np.inf
+
+    return distances
+
+
+def select_survivors(ranks, distances, size):
+    """Select indices of the best `size` solutions by rank and crowding distance.
+
+    Whole fronts are taken while they fit. From the front that does not fit,
+    the solutions with the highest crowding distance are picked with
+    np.argpartition, so no full sort is needed.
+
+    Parameters
+    ----------
+    ranks : numpy.ndarray
+        Front index of every solution.
+    distances : numpy.ndarray
+        Crowding distance of every solution.
+    size : int
+        Number of solutions to select.
+
+    Returns
+    -------
+    numpy.ndarray of selected indices.
+    """
+    ranks = np.asarray(ranks)
+    distances = np.asarray(distances)
+
+    if len(ranks) <= size:
+        return np.arange(len(ranks))
+
+    # The first front which does not fit completely.
+    cutoff_rank = np.searchsorted(np.cumsum(np.bincount(ranks)), size, side='right')
+
+    selected = np.flatnonzero(ranks < cutoff_rank)
+    remaining = size - len(selected)
+
+    if remaining > 0:
+        candidates = np.flatnonzero(ranks == cutoff_rank)
+        best = np.argpartition(-distances[candidates], remaining - 1)[:remaining]
+        selected = np.concatenate((selected, candidates[best]))
+
+    return selected
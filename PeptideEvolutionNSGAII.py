@@ -1,46 +1,27 @@
 #!/usr/bin/env python3
 
+import os
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 import numpy as np
 import RandomGenerator
 import FitnessFunctionScraper
-import os
 import Mutations
+import ParetoRanking
+import Checkpoint
+import Offspring
+from FitnessCache import FitnessCache
+from Hypervolume import DEFAULT_REFERENCE, HypervolumeArchive
+from Instrumentation import Instrumentation
+from EvaluationEngine import EvaluationEngine
+from Population import Population, Peptide, encode_sequences, decode_sequences
 
 class NSGA_II:
 
-    # Class Peptide is used to conveniently store all info about a solution.
-    class Peptide:
-        def __init__(self, peptide_list, peptide_string, ff_amp_probability, ff_toxicity):
-            """Store information about a single solution.
-
-                       Parameters
-                       ----------
-                       peptide_list : list
-                           List of peptides aminoacids.
-                           E.g. ['A','D','K','R','S','M','E','A','C'...]
-                       peptide_string : string
-                           Peptide label.
-                       ff_amp_probability : float
-                           The possibility that antimicrobial peptide have antimicrobial properties.
-                       ff_toxicity : float
-                           The SVM score of toxicity of the peptide.
-
-                       """
-
-            self.peptide_list = peptide_list
-            self.peptide_string = peptide_string
-            self.ff_amp_probability = ff_amp_probability
-            self.ff_toxicity = ff_toxicity
-
-            # When a solution is created, set its rank and crowding distance
-            # to initial values.
-            self.reset()
-
-        def reset(self):
-            """Reset rank and crowding distance to initial values."""
-            self.rank = -1
-            self.distance = 0
-
+    # Class Peptide is used to conveniently access all info about a solution.
+    # It is a view of a single row of a Population.
+    Peptide = Peptide
 
     def __init__(self,
                  lowerRange,
@@ -50,7 +31,19 @@ class NSGA_II:
                  num_generations,
                  num_solutions_tournament,
                  mutation_probability,
-                 penalty_function_reducer
+                 penalty_function_reducer,
+                 fitness_cache=None,
+                 evaluator=None,
+                 seed=None,
+                 duplicate_regeneration_budget=0,
+                 surrogate=None,
+                 surrogate_oversampling=4,
+                 checkpoint_path=None,
+                 hypervolume_reference=DEFAULT_REFERENCE,
+                 stopping_criteria=(),
+                 instrumentation=None,
+                 evaluation_archive=None,
+                 run_id=0
                  ):
         """Save the forwarded arguments.
 
@@ -72,6 +65,38 @@ class NSGA_II:
             The probability of a mutation occurring.
         penalty_function_reducer : float
             Number which is used for reducing AMP probability if sequences are the same.
+        fitness_cache : FitnessCache
+            Cache of remote predictor results. If None, an in-memory cache is used.
+        evaluator : Evaluator
+            Backend which scores peptide batches with both predictors.
+            If None, an EvaluationEngine querying the live web services is used.
+        seed : int
+            Seed of the random number generator, for reproducible runs.
+        duplicate_regeneration_budget : int
+            Maximum number of extra children bred per generation to replace
+            children identical to each other or to population members.
+        surrogate : SurrogateModel
+            Local model used to pre-screen children before remote scoring.
+            If None, every child is scored remotely.
+        surrogate_oversampling : int
+            How many candidates per child are bred for the surrogate to choose from.
+        checkpoint_path : string
+            Path of the snapshot written after every generation (see Checkpoint).
+            If None, no checkpoints are written.
+        hypervolume_reference : tuple
+            Reference (ff_amp_probability, ff_toxicity) point of the hypervolume
+            of self.pareto_archive.
+        stopping_criteria : list
+            StoppingCriterion objects which can end the run before
+            num_generations, e.g. on hypervolume stagnation or a budget.
+        instrumentation : Instrumentation
+            Timers, counters and per-generation metric sinks. If None, metrics
+            are only collected in memory.
+        evaluation_archive : EvaluationArchive
+            Columnar store receiving every evaluated peptide with its
+            generation. If None, evaluations are not recorded.
+        run_id : int
+            Identifier of this run in evaluation_archive.
         """
 
         self.lowerRange = lowerRange
@@ -82,6 +107,34 @@ class NSGA_II:
         self.num_solutions_tournament = num_solutions_tournament
         self.mutation_probability = mutation_probability
         self.penalty_function_reducer = penalty_function_reducer
+        self.fitness_cache = fitness_cache if fitness_cache is not None else FitnessCache()
+        self.evaluator = evaluator if evaluator is not None else EvaluationEngine()
+        self.rng = np.random.default_rng(seed)
+
+        self.duplicate_regeneration_budget = duplicate_regeneration_budget
+        self.surrogate = surrogate
+        self.surrogate_oversampling = surrogate_oversampling
+        self.checkpoint_path = checkpoint_path
+        self.stopping_criteria = list(stopping_criteria)
+        self.instrumentation = instrumentation if instrumentation is not None else Instrumentation()
+        self.evaluation_archive = evaluation_archive
+        self.run_id = run_id
+
+        # Number of applied mutations per mutation type.
+        self.mutation_counts = Counter()
+
+        # Number of requested, duplicate, regenerated, cached and remotely submitted peptides.
+        self.evaluation_counts = Counter()
+
+        # Every non-dominated peptide evaluated during the run, including
+        # those that did not survive selection.
+        self.pareto_archive = HypervolumeArchive(hypervolume_reference)
+
+        # (submitted evaluations, archive hypervolume) after every generation.
+        self.hypervolume_history = []
+
+        # Generation (or merged batch in steady-state mode) being evaluated.
+        self.generation_number = 0
 
 
     def calculate(self):
@@ -99,13 +152,66 @@ class NSGA_II:
              Value of fitness function that represent possibility of peptide having AMP properties).
         """
 
-        generation_number = 1
-        population = self.generate_random_population(self.lowerRange, self.upperRange, self.population_size)
+        with self.instrumentation.profiling():
+            population = self.initialize_population()
+            self.save_checkpoint(population, 0)
+
+            return self.run_generations(population, 1)
+
+
+    def resume(self, checkpoint_path=None):
+        """Continue a run from the last generation saved in a checkpoint.
+
+        Restores the population, the random number generator, the counters,
+        the Pareto archive and any cached predictor results, so no peptide
+        scored before the interruption is sent to the web services again.
 
-        non_dominated_sorted_population = self.perform_non_dominated_sort(population)
+        Parameters
+        ----------
+        checkpoint_path : string
+            Path of the snapshot. Defaults to self.checkpoint_path.
+
+        Returns
+        -------
+        List of pareto fronts, like calculate.
+        """
+        if checkpoint_path is not None:
+            self.checkpoint_path = checkpoint_path
 
-        for i, _ in enumerate(non_dominated_sorted_population):
-            self.calculate_crowding_distance(non_dominated_sorted_population[i])
+        population, archive, state = Checkpoint.load_checkpoint(self.checkpoint_path)
+
+        self.rng.bit_generator.state = state['rng_state']
+        self.mutation_counts = Counter(state['mutation_counts'])
+        self.evaluation_counts = Counter(state['evaluation_counts'])
+
+        self.pareto_archive = HypervolumeArchive(self.pareto_archive.reference)
+        self.pareto_archive.insert_many(archive)
+        self.hypervolume_history = [tuple(entry) for entry in state['hypervolume_history']]
+
+        for predictor_key, entries in state['cache_entries'].items():
+            self.fitness_cache.put_many(predictor_key, entries)
+
+        print('Resuming after generation {}/{}'.format(state['generation_number'], self.num_generations))
+
+        with self.instrumentation.profiling():
+            return self.run_generations(population, state['generation_number'] + 1)
+
+
+    def run_generations(self, population, generation_number):
+        """Evolve population from generation_number up to self.num_generations.
+
+        Parameters
+        ----------
+        population : Population
+            Ranked Population object.
+        generation_number : int
+            Number of the first generation to run.
+
+        Returns
+        -------
+        List of pareto fronts, like calculate.
+        """
+        self.start_stopping_criteria()
 
         while True:
             if generation_number > self.num_generations:
@@ -113,23 +219,189 @@ class NSGA_II:
 
             print('Generation: {}/{}'.format(generation_number, self.num_generations))
 
-            # Generate offspring
-            offspring = self.generate_offspring(population)
-            population += offspring
+            self.generation_number = generation_number
+            try:
+                population = self.evolve_generation(population)
+            except Exception:
+                # Scores received before the failure are only in the fitness
+                # cache; keep them with the last checkpoint for resume.
+                self.save_cache_entries()
+                raise
+            self.record_progress()
+            self.instrumentation.end_generation(generation_number, self.generation_metrics())
+            self.save_checkpoint(population, generation_number)
+
+            reason = self.stopping_reason(population)
+            if reason is not None:
+                print('Stopping after generation {}: {}'.format(generation_number, reason))
+                break
+
+            generation_number += 1
 
-            for solution in population:
-                solution.reset()
+        self.print_statistics()
 
-            non_dominated_sorted_population = self.perform_non_dominated_sort(population)
+        return self.pareto_fronts(population)
 
-            for i, _ in enumerate(non_dominated_sorted_population):
-                self.calculate_crowding_distance(non_dominated_sorted_population[i])
 
-            population = self.next_generation(non_dominated_sorted_population)
-            generation_number += 1
+    def start_stopping_criteria(self):
+        for criterion in self.stopping_criteria:
+            criterion.start(self)
+
+
+    def stopping_reason(self, population):
+        """Return the reason of the first stopping criterion that is met, or None."""
+        for criterion in self.stopping_criteria:
+            reason = criterion.should_stop(self, population)
+            if reason is not None:
+                return reason
+        return None
+
+
+    def save_checkpoint(self, population, generation_number):
+        """Write a checkpoint to self.checkpoint_path, if set."""
+        if self.checkpoint_path is not None:
+            Checkpoint.save_checkpoint(self.checkpoint_path, self, population, generation_number)
+
+
+    def save_cache_entries(self):
+        """Add the cached predictor results to the last checkpoint, if one was written."""
+        if self.checkpoint_path is not None and os.path.exists(self.checkpoint_path):
+            Checkpoint.save_cache_entries(self.checkpoint_path, self)
 
-        for solution in population:
-            solution.reset()
+
+    def calculate_steady_state(self, batch_size=None, max_in_flight=2):
+        """Use steady-state NSGA-II, overlapping breeding with remote scoring.
+
+        Instead of waiting for a whole generation to be scored, small batches
+        of children are kept in flight. Whenever a batch returns it is merged
+        into the population right away and a new batch is bred from the
+        updated population, so the evaluator is never idle while the
+        population is being ranked.
+
+        The run stops after num_generations * offspring_size children, or
+        when a stopping criterion is met; criteria are checked after every
+        merged batch instead of every generation.
+
+        Parameters
+        ----------
+        batch_size : int
+            Number of children per batch. Defaults to self.offspring_size.
+        max_in_flight : int
+            Number of batches being scored at the same time.
+
+        Returns
+        -------
+        List of pareto fronts, like calculate.
+        """
+        batch_size = batch_size or self.offspring_size
+        num_children = self.num_generations * self.offspring_size
+
+        start = time.perf_counter()
+        with self.instrumentation.profiling():
+            population = self.initialize_population()
+            bred = 0
+            merged = 0
+            batch_number = 0
+            reason = None
+            self.start_stopping_criteria()
+
+            with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+                in_flight = {}
+
+                def submit_batch():
+                    # Breed from the current population, look the children up in
+                    # the cache and send only the misses to the evaluator.
+                    children = self.create_children(population, min(batch_size, num_children - bred))
+                    amp_probabilities, toxicities, misses = self.look_up_scores(children)
+
+                    if misses:
+                        future = executor.submit(self.score_remotely, misses)
+                    else:
+                        future = Future()
+                        future.set_result({})
+
+                    in_flight[future] = (children, amp_probabilities, toxicities)
+                    return len(children)
+
+                while bred < num_children and len(in_flight) < max_in_flight:
+                    bred += submit_batch()
+
+                while in_flight:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+
+                    for future in done:
+                        children, amp_probabilities, toxicities = in_flight.pop(future)
+                        self.record_scores(future.result(), amp_probabilities, toxicities)
+                        self.generation_number = batch_number + 1
+
+                        offspring = self.population_from_evaluations(
+                            self.collect_scores(children, amp_probabilities, toxicities))
+                        population = self.merge_offspring(population, offspring)
+                        merged += len(children)
+                        batch_number += 1
+
+                        print('Children: {}/{}'.format(merged, num_children))
+                        self.record_progress()
+                        self.instrumentation.end_generation(batch_number, self.generation_metrics())
+
+                        if reason is None:
+                            reason = self.stopping_reason(population)
+                            if reason is not None:
+                                print('Stopping after {} children: {}'.format(merged, reason))
+
+                        if bred < num_children and reason is None:
+                            bred += submit_batch()
+
+        elapsed = time.perf_counter() - start
+        print('Throughput: {:.1f} evaluations/minute'.format(60 * merged / elapsed if elapsed else 0.0))
+        self.print_statistics()
+
+        return self.pareto_fronts(population)
+
+
+    def record_progress(self):
+        """Append the current archive hypervolume to self.hypervolume_history and print it."""
+        self.hypervolume_history.append((self.evaluation_counts['submitted'], self.pareto_archive.hypervolume))
+        print('Hypervolume: {:.4f}'.format(self.pareto_archive.hypervolume))
+
+
+    def generation_metrics(self):
+        """Return the run metrics recorded with every generation by self.instrumentation."""
+        return {
+            'hypervolume': self.pareto_archive.hypervolume,
+            'pareto_archive_size': len(self.pareto_archive),
+            'evaluations': dict(self.evaluation_counts),
+            'mutations': dict(self.mutation_counts),
+            'fitness_cache': self.fitness_cache.stats(),
+        }
+
+
+    def print_statistics(self):
+        """Print fitness cache, mutation and evaluation counters."""
+        # A peptide is a hit when both predictors have it cached; misses are submitted.
+        print('Fitness cache: {} hits, {} misses'.format(
+            self.evaluation_counts['cache_hits'], self.evaluation_counts['submitted']))
+        print('Mutations: {}'.format(dict(self.mutation_counts)))
+        print('Evaluations: {}'.format(dict(self.evaluation_counts)))
+        print('Pareto archive: {} peptides, hypervolume {:.4f}'.format(
+            len(self.pareto_archive), self.pareto_archive.hypervolume))
+
+
+    def pareto_fronts(self, population):
+        """Rank the final population and convert its pareto fronts into tuples.
+
+        Parameters
+        ----------
+        population : Population
+            Final Population object.
+
+        Returns
+        -------
+        List of pareto fronts.
+            Each pareto front is a list of
+            (peptide_list, peptide_string, ff_amp_probability, ff_toxicity) tuples.
+        """
+        population.reset()
 
         pareto_fronts = self.perform_non_dominated_sort(population)
         return [
@@ -142,6 +414,62 @@ class NSGA_II:
         ]
 
 
+    def initialize_population(self):
+        """Generate, score and rank the initial population.
+
+        Returns
+        -------
+        Population object.
+        """
+        population = self.generate_random_population(self.lowerRange, self.upperRange, self.population_size)
+
+        self.rank_population(population)
+        self.calculate_crowding_distances(population)
+
+        return population
+
+
+    def evolve_generation(self, population):
+        """Run a single generation: breed and score offspring, rank and select survivors.
+
+        Parameters
+        ----------
+        population : Population
+            Ranked Population object.
+
+        Returns
+        -------
+        Ranked Population object of the next generation.
+        """
+        # Generate offspring
+        offspring = self.generate_offspring(population)
+
+        return self.merge_offspring(population, offspring)
+
+
+    def merge_offspring(self, population, offspring):
+        """Add evaluated offspring to the population, rank it and keep the best.
+
+        Parameters
+        ----------
+        population : Population
+            Population object.
+        offspring : Population
+            Evaluated offspring.
+
+        Returns
+        -------
+        Ranked Population object of self.population_size individuals.
+        """
+        population = population.concatenate(offspring)
+        population.reset()
+
+        self.rank_population(population)
+        self.calculate_crowding_distances(population)
+
+        return self.next_generation(population)
+
+
     def generate_random_population(self, lowerRange, upperRange, population_size):
         """Generate N random individuals within given range.
 
@@ -158,149 +486,215 @@ class NSGA_II:
 
                 Returns
                 -------
-                List of self.Peptide objects.
+                Population object.
                 """
-        peptides = RandomGenerator.generate_random_peptides(lowerRange, upperRange, population_size)
+        with self.instrumentation.timer('random_generation'):
+            sequences, _ = RandomGenerator.generate_random_sequences(lowerRange, upperRange, population_size, self.rng)
 
-        list_of_peptide_objects = []
+        return self.population_from_evaluations(self.evaluate_peptides(decode_sequences(sequences)))
 
-        with open('in.txt', 'w') as file:
-            for peptide in peptides:
-                peptide_string = ''.join(peptide)
-                file.write(f'>{peptide_string}\n{peptide_string}\n')
 
+    def evaluate_peptides(self, peptide_strings):
+        """Score peptides with both remote predictors.
 
-        peptide_and_ff_amp_probability = FitnessFunctionScraper.scrape_fitness_function()
-        toxicity = FitnessFunctionScraper.toxicity()
-        
-        if os.path.exists('in.txt'):
-            os.remove('in.txt')
+        Identical peptides are scored once. Only peptides missing from
+        self.fitness_cache are sent to the web services; their results are
+        stored in the cache afterwards. Peptides identical to population
+        members are therefore served from the cache.
 
-        for (peptide_string, ff_amp_probability), (peptide_id, svm_score, prediction) in zip(peptide_and_ff_amp_probability, toxicity):
-            list_of_peptide_objects.append(self.Peptide(list(peptide_string), peptide_string, float(ff_amp_probability), float(svm_score)))
+        Parameters
+        ----------
+        peptide_strings : list
+            List of peptide strings.
+
+        Returns
+        -------
+        List of (peptide_string, ff_amp_probability, svm_score, prediction) tuples
+            in the same order as peptide_strings.
+        """
+        amp_probabilities, toxicities, misses = self.look_up_scores(peptide_strings)
+
+        if misses:
+            with self.instrumentation.timer('evaluation'):
+                scores = self.score_remotely(misses)
+            self.record_scores(scores, amp_probabilities, toxicities)
 
-        return list_of_peptide_objects
+        return self.collect_scores(peptide_strings, amp_probabilities, toxicities)
+
+
+    def score_remotely(self, peptide_strings):
+        """Score peptides with self.evaluator.
+
+        If the evaluation fails part way, the predictor results which did
+        complete are stored in self.fitness_cache before the error is
+        raised, so a resumed run does not submit them again.
+        """
+        try:
+            # The evaluator may be shared, so it reports remote timings and retries per call.
+            return self.evaluator.evaluate(peptide_strings, self.instrumentation)
+        except FitnessFunctionScraper.PartialEvaluationError as error:
+            self.fitness_cache.put_many(FitnessFunctionScraper.camp_predictor_key(),
+                                        list(error.amp_probabilities.items()))
+            self.fitness_cache.put_many(FitnessFunctionScraper.toxinpred_predictor_key(),
+                                        list(error.toxicities.items()))
+            raise
+
+
+    def look_up_scores(self, peptide_strings):
+        """Look peptides up in self.fitness_cache.
+
+        Parameters
+        ----------
+        peptide_strings : list
+            List of peptide strings.
+
+        Returns
+        -------
+        Tuple (amp_probabilities, toxicities, misses).
+            Dictionaries of the cached scores and the list of distinct
+            peptides that still have to be scored remotely.
+        """
+        # Collapse identical peptides so every distinct sequence is looked up
+        # and submitted only once; scores are fanned back out by the caller.
+        unique_peptide_strings = list(dict.fromkeys(peptide_strings))
+        self.evaluation_counts['requested'] += len(peptide_strings)
+        self.evaluation_counts['duplicates'] += len(peptide_strings) - len(unique_peptide_strings)
+
+        amp_probabilities = self.fitness_cache.get_many(FitnessFunctionScraper.camp_predictor_key(), unique_peptide_strings)
+        toxicities = self.fitness_cache.get_many(FitnessFunctionScraper.toxinpred_predictor_key(), unique_peptide_strings)
+
+        misses = [peptide_string for peptide_string in unique_peptide_strings
+                  if peptide_string not in amp_probabilities or peptide_string not in toxicities]
+        self.evaluation_counts['cache_hits'] += len(unique_peptide_strings) - len(misses)
+        self.evaluation_counts['submitted'] += len(misses)
+
+        return amp_probabilities, toxicities, misses
+
+
+    def record_scores(self, scores, amp_probabilities, toxicities):
+        """Store remote scores in self.fitness_cache and in the given dictionaries.
+
+        Parameters
+        ----------
+        scores : dict
+            Evaluator output, peptide_string -> (ff_amp_probability, svm_score, prediction).
+        amp_probabilities : dict
+            Dictionary from look_up_scores, updated in place.
+        toxicities : dict
+            Dictionary from look_up_scores, updated in place.
+        """
+        new_amp_probabilities = []
+        new_toxicities = []
+
+        for peptide_string, (ff_amp_probability, svm_score, prediction) in scores.items():
+            amp_probabilities[peptide_string] = ff_amp_probability
+            toxicities[peptide_string] = (svm_score, prediction)
+            new_amp_probabilities.append((peptide_string, ff_amp_probability))
+            new_toxicities.append((peptide_string, (svm_score, prediction)))
+
+        self.fitness_cache.put_many(FitnessFunctionScraper.camp_predictor_key(), new_amp_probabilities)
+        self.fitness_cache.put_many(FitnessFunctionScraper.toxinpred_predictor_key(), new_toxicities)
+
+        # Every remote result is new training data for the surrogate.
+        if self.surrogate is not None:
+            self.surrogate.add_training_data([
+                (peptide_string, ff_amp_probability, svm_score)
+                for peptide_string, (ff_amp_probability, svm_score, prediction) in scores.items()
+            ])
+
+
+    def collect_scores(self, peptide_strings, amp_probabilities, toxicities):
+        """Fan scores back out to peptide_strings and update self.pareto_archive and self.evaluation_archive.
+
+        Returns
+        -------
+        List of (peptide_string, ff_amp_probability, svm_score, prediction) tuples
+            in the same order as peptide_strings.
+        """
+        evaluated_peptides = [
+            (peptide_string, amp_probabilities[peptide_string]) + tuple(toxicities[peptide_string])
+            for peptide_string in peptide_strings
+        ]
+
+        self.pareto_archive.insert_many(
+            (peptide_string, ff_amp_probability, svm_score)
+            for peptide_string, ff_amp_probability, svm_score, _ in evaluated_peptides
+        )
+
+        if self.evaluation_archive is not None:
+            self.evaluation_archive.append(
+                [peptide_string for peptide_string, _, _, _ in evaluated_peptides],
+                [ff_amp_probability for _, ff_amp_probability, _, _ in evaluated_peptides],
+                [svm_score for _, _, svm_score, _ in evaluated_peptides],
+                self.generation_number,
+                self.run_id
+            )
+
+        return evaluated_peptides
+
+
+    @staticmethod
+    def population_from_evaluations(evaluated_peptides):
+        """Build a Population from evaluate_peptides output."""
+        return Population.from_strings(
+            [peptide_string for peptide_string, _, _, _ in evaluated_peptides],
+            [ff_amp_probability for _, ff_amp_probability, _, _ in evaluated_peptides],
+            [svm_score for _, _, svm_score, _ in evaluated_peptides]
+        )
+
+
+    def rank_population(self, population):
+        """Penalize duplicated peptides and store the front index of every row.
+
+        Ranks are stored in the population's rank column. No self.Peptide
+        views are created, so this is what the selection loop uses.
+
+        Parameters
+        ----------
+        population : Population
+            Population object.
+
+        Returns
+        -------
+        List of index arrays, one per pareto front.
+        """
+
+        with self.instrumentation.timer('non_dominated_sort'):
+            # Count how many times every sequence occurs. Padded rows are equal
+            # exactly when the peptide strings are equal.
+            _, inverse, counts = np.unique(population.sequences, axis=0, return_inverse=True, return_counts=True)
+            duplicated = counts[inverse.reshape(-1)] > 1
+
+            # Add a penalty to the fitness function value of peptides that occur more than once.
+            population.ff_amp_probability[duplicated] -= population.ff_amp_probability[duplicated] * self.penalty_function_reducer
+
+            # Let the batched engine divide the population into pareto fronts.
+            pareto_fronts, population.rank[:] = ParetoRanking.non_dominated_sort(population.objectives())
+
+        return pareto_fronts
 
 
     def perform_non_dominated_sort(self, population):
         """Divide the population into pareto fronts.
-    
+
+        Ranks are stored in the population's rank column.
+
         Parameters
         ----------
-        population : list
-            List of self.Peptide objects.
-    
+        population : Population
+            Population object.
+
         Returns
         -------
         List of lists of self.Peptide objects.
             E.g., [[Peptide#1, Peptide#2, ...], ...]
         """
-    
-        # Create a dictionary to store the count of each peptide.
-        peptide_counts = {}
-        for peptide in population:
-            peptide_string = peptide.peptide_string
-            if peptide_string in peptide_counts:
-                peptide_counts[peptide_string] += 1
-            else:
-                peptide_counts[peptide_string] = 1
-    
-        # Add a penalty to the fitness function value of peptides that occur more than once.
-        for peptide in population:
-            peptide_string = peptide.peptide_string
-            count = peptide_counts[peptide_string]
-            if count > 1:
-                penalty = peptide.ff_amp_probability * self.penalty_function_reducer  # Adjust the penalty factor as needed.
-                peptide.ff_amp_probability -= penalty
-    
-        # list_of_dominated_indices[n] will store indices of solutions
-        # population[n] dominates over.
-        list_of_dominated_indices = [[] for _ in population]
-    
-        # domination_count[n] will store how many solutions dominate over
-        # population[n].
-        domination_count = np.zeros(len(population))
-    
-        pareto_fronts = [[]]
-    
-        for i, _ in enumerate(population):
-            for j, _ in enumerate(population):
-    
-                if i == j:
-                    continue
-    
-                # Check if one solution dominates over the other, or they
-                # are equal.
-
-                # amp_weight = 0.7
-                # toxicity_weight = 0.3
-    
-                # amp_prob_diff = amp_weight * (population[i].ff_amp_probability - population[j].ff_amp_probability)
-                # toxicity_diff = toxicity_weight * (population[i].ff_toxicity - population[j].ff_toxicity)
-                amp_prob_diff = np.sign(population[i].ff_amp_probability - population[j].ff_amp_probability)
-                toxicity_diff = np.sign(population[i].ff_toxicity - population[j].ff_toxicity)
-                # if amp_prob_diff >= 0 and toxicity_diff <= 0:
-                # elif amp_prob_diff < 0 and toxicity_diff > 0:
-
-
-
-                if (amp_prob_diff > 0 and toxicity_diff >= 0) or (amp_prob_diff >= 0 and toxicity_diff > 0):
-                    # In this case, population[i] dominates over population[j].
-                    list_of_dominated_indices[i].append(j)
-                elif amp_prob_diff < 0 and toxicity_diff < 0:
-                    # In this case, population[j] dominates over population[i].
-                    domination_count[i] += 1
-    
-            if domination_count[i] == 0:
-                # Solution population[i] is not dominated by any other solution,
-                # therefore it belongs to the first (best) pareto front.
-                population[i].rank = 0
-                pareto_fronts[0].append(i)
-    
-        i = 0
-        # Iterate until each solution is assigned to a pareto front.
-        while len(pareto_fronts[i]) > 0:
-            # A list where solutions that belong to the next pareto front
-            # will be saved.
-            next_pareto_front = []
-    
-            # Iterate over solutions on the last pareto front.
-            for j in pareto_fronts[i]:
-                for k in list_of_dominated_indices[j]:
-                    # Reduce domination count for the solutions that are dominated
-                    # by the individuals on the current pareto front.
-                    domination_count[k] -= 1
-    
-                    # If the solution is no longer dominated, that is, all the
-                    # solutions that dominated over the current solution were
-                    # deployed to pareto fronts, add current solution to the
-                    # next pareto front.
-                    if domination_count[k] == 0:
-                        population[k].rank = i + 1
-                        next_pareto_front.append(k)
-    
-            # Jump to next pareto front.
-            i += 1
-    
-            # Add current pareto front to the list of all pareto fronts.
-            pareto_fronts.append(next_pareto_front)
-    
-        # Last pareto front is empty (check 'while' condition above), so
-        # we remove it.
-        del pareto_fronts[-1]
-    
-        # Turn pareto front indices into objects; Replace index with the
-        # corresponding object in 'population'.
-    
-        object_pareto_fronts = []
-    
-        for pareto_front in pareto_fronts:
-            current_front = []
-            for index in pareto_front:
-                current_front.append(population[index])
-            object_pareto_fronts.append(current_front)
-    
-        return object_pareto_fronts
+        pareto_fronts = self.rank_population(population)
+
+        # Turn pareto front indices into views of the population.
+        return [
+            [population[int(index)] for index in pareto_front] for pareto_front in pareto_fronts
+        ]
 
 
     def calculate_crowding_distance(self, pareto_front):
@@ -314,39 +708,29 @@ class NSGA_II:
         pareto_front : list
             List of self.Peptide objects.
         """
-        sorted_front_ff_amp_probability = sorted(
-            pareto_front,
-            key=lambda solution: solution.ff_amp_probability
-        )
-
-        sorted_front_ff_toxicity = sorted(
-            pareto_front,
-            key=lambda solution: solution.ff_toxicity
-        )
+        objectives = np.array(
+            [(solution.ff_amp_probability, solution.ff_toxicity) for solution in pareto_front],
+            dtype=float
+        ).reshape(len(pareto_front), 2)
 
-        # First and last solution in the sorted arrays have infinite
-        # crowding distance because they only have one neighbour.
-        sorted_front_ff_amp_probability[0].distance = np.inf
-        sorted_front_ff_amp_probability[-1].distance = np.inf
+        distances = ParetoRanking.crowding_distances(objectives, np.zeros(len(pareto_front), dtype=int))
 
-        sorted_front_ff_toxicity[0].distance = np.inf
-        sorted_front_ff_toxicity[-1].distance = np.inf
+        for solution, distance in zip(pareto_front, distances):
+            solution.distance += distance
 
-        # Calculate maximum distance for each fitness function separately.
-        max_ff_amp_probability = sorted_front_ff_amp_probability[-1].ff_amp_probability - sorted_front_ff_amp_probability[0].ff_amp_probability
-        max_ff_toxicity = sorted_front_ff_toxicity[-1].ff_toxicity - sorted_front_ff_toxicity[0].ff_toxicity
+    def calculate_crowding_distances(self, population):
+        """Calculate crowding distance for all pareto fronts at once.
 
+        The population must already be ranked by rank_population.
+        This function modifies the population's distance column and returns nothing.
 
-        if max_ff_amp_probability <= 0:
-            max_ff_amp_probability = 1
-
-        if max_ff_toxicity <= 0:
-            max_ff_toxicity = 1
-
-        for i in range(1, len(pareto_front) - 1):
-            # Contribution of ff_amp_probability
-            sorted_front_ff_amp_probability[i].distance += (sorted_front_ff_amp_probability[i+1].ff_amp_probability - sorted_front_ff_amp_probability[i-1].ff_amp_probability) / max_ff_amp_probability
-            sorted_front_ff_toxicity[i].distance += (sorted_front_ff_toxicity[i+1].ff_toxicity - sorted_front_ff_toxicity[i-1].ff_toxicity) / max_ff_toxicity
+        Parameters
+        ----------
+        population : Population
+            Population object.
+        """
+        with self.instrumentation.timer('crowding'):
+            population.distance += ParetoRanking.crowding_distances(population.objectives(), population.rank)
 
     def generate_offspring(self, population):
         """Generate offspring.
@@ -355,160 +739,172 @@ class NSGA_II:
 
         Parameters
         ----------
-        population : list
-            List of self.Peptide objects.
+        population : Population
+            Population object.
 
         Returns
         -------
-        List of self.Peptide objects.
-            E.g., [Peptide#1, Peptide#2, ...]
+        Population object.
         """
 
-        offspring = []
-        offspring_peptides = []
+        evaluated_peptides = self.evaluate_peptides(self.create_children(population, self.offspring_size))
 
-        # Generate a predefined number of individuals.
-        for _ in range(self.offspring_size):
-            offspring.append(self.generate_single_solution(population))
+        return self.population_from_evaluations(evaluated_peptides)
 
-        with open('in.txt', 'w') as file:
-            for peptide in offspring:
-                peptide_string = ''.join(peptide)
-                file.write(f'>{peptide_string}\n{peptide_string}\n')
 
+    def create_children(self, population, count):
+        """Breed the children which are sent to evaluation.
 
-        peptide_and_ff_amp_probability = FitnessFunctionScraper.scrape_fitness_function()
-        toxicity = FitnessFunctionScraper.toxicity()
-        
-        if os.path.exists('in.txt'):
-            os.remove('in.txt')
-
-        for (peptide_string, ff_amp_probability), (peptide_id, svm_score, prediction) in zip(peptide_and_ff_amp_probability, toxicity):
-            print("Peptide: ", peptide_string)
-            print("Toxicity: ", svm_score, prediction)
-            offspring_peptides.append(self.Peptide(list(peptide_string), peptide_string, float(ff_amp_probability), float(svm_score)))
-
-        return offspring_peptides
-
-
-    def generate_single_solution(self, population):
-        """Generate a single child.
+        Applies surrogate pre-screening and duplicate regeneration when enabled.
 
         Parameters
         ----------
-        population : list
-            List of self.Peptide objects.
+        population : Population
+            Population object.
+        count : int
+            Number of children.
 
         Returns
         -------
-        self.Peptide object.
+        List of child peptide strings.
         """
-        first_parent = self.tournament_select_parent(population).peptide_list
-        second_parent = self.tournament_select_parent(population).peptide_list
-
-        recombination_index = np.random.randint(0, len(first_parent))
+        if self.surrogate is not None and self.surrogate.ready:
+            # Breed more candidates than needed and keep only those the
+            # surrogate predicts to be the best.
+            with self.instrumentation.timer('breeding'):
+                candidates = self.breed(population, count * self.surrogate_oversampling)
+            with self.instrumentation.timer('surrogate'):
+                promising = self.surrogate.select_promising(*encode_sequences(candidates), count)
+            children = [candidates[index] for index in promising]
+        else:
+            with self.instrumentation.timer('breeding'):
+                children = self.breed(population, count)
 
-        child_peptide_list = first_parent[:recombination_index] + second_parent[recombination_index:]
-        
-        if np.random.rand() < self.mutation_probability:
-            child_peptide_list = self.mutate(child_peptide_list)
-        
-        return child_peptide_list
+        if self.duplicate_regeneration_budget > 0:
+            with self.instrumentation.timer('breeding'):
+                children = self.regenerate_duplicates(population, children)
 
+        return children
 
-    def tournament_select_parent(self, population):
-        """Select one parent by tournament selection.
 
-        Use self.num_solutions_tournament.
+    def breed(self, population, count):
+        """Create children by tournament selection, crossover and mutation.
 
         Parameters
         ----------
-        population : list
-            List of self.Peptide objects.
+        population : Population
+            Population object.
+        count : int
+            Number of children.
 
         Returns
         -------
-        self.Peptide object.
+        List of child peptide strings.
         """
 
-        # Select a random parent.
-        random_parent = population[np.random.randint(0, len(population))]
+        # Run all tournaments at once; the first half of the winners are the
+        # first parents, the second half the second parents.
+        parents = Offspring.tournament_select(
+            population.rank,
+            population.distance,
+            2 * count,
+            self.num_solutions_tournament,
+            self.rng
+        )
 
-        for i in range(self.num_solutions_tournament-1):
-            # Select random opponent.
-            random_opponent = population[np.random.randint(0, len(population))]
+        children, child_lengths = Offspring.one_point_crossover(
+            population.sequences,
+            population.lengths,
+            parents[:count],
+            parents[count:],
+            self.rng
+        )
 
-            # Pick a winner.
-            if random_opponent.rank < random_parent.rank or \
-                (random_opponent.rank == random_parent.rank and random_opponent.distance > random_parent.distance):
-                random_parent = random_opponent
+        # Mutate a random subset of children, each with a random mutation type.
+        mutation_mask = self.rng.random(count) < self.mutation_probability
+        operators = self.rng.integers(0, len(Mutations.MUTATION_NAMES), count)
+
+        children, child_lengths, operators = Mutations.mutate_batch(
+            children,
+            child_lengths,
+            mutation_mask,
+            operators,
+            self.lowerRange,
+            self.upperRange,
+            self.rng
+        )
+        self.mutation_counts.update(Mutations.count_mutations(mutation_mask, operators))
 
-        return random_parent
+        return decode_sequences(children)
 
 
-    def mutate(self, child_peptide_list):
-        """Mutate a child.
+    def regenerate_duplicates(self, population, offspring):
+        """Replace duplicate children with new ones.
 
-                This function modifies child peptide list and returns a new list.
-                There are four possible functions for modification.
+        A child is a duplicate if it is identical to a population member or
+        to an earlier child. At most self.duplicate_regeneration_budget
+        replacement children are bred; duplicates left after that are kept.
 
-                Parameters
-                ----------
-                child_peptide_list : list,
-                    List of peptide aminoacids.
+        Parameters
+        ----------
+        population : Population
+            Population object.
+        offspring : list
+            List of child peptide strings.
 
-                Returns
-                -------
-                List, A modified peptide aminoacids list.
-                """
+        Returns
+        -------
+        List of child peptide strings.
+        """
+        offspring = list(offspring)
+        population_strings = set(population.peptide_strings())
+        budget = self.duplicate_regeneration_budget
+
+        def duplicate_indices():
+            seen = set(population_strings)
+            indices = []
+            for index, peptide_string in enumerate(offspring):
+                if peptide_string in seen:
+                    indices.append(index)
+                else:
+                    seen.add(peptide_string)
+            return indices
+
+        duplicates = duplicate_indices()
 
-        randInt = np.random.randint(0, 4)
+        while duplicates and budget > 0:
+            replacements = self.breed(population, min(len(duplicates), budget))
+            budget -= len(replacements)
+            self.evaluation_counts['regenerated'] += len(replacements)
 
-        if randInt == 0:
-            child_peptide_list = Mutations.add_amino_acid(child_peptide_list)
-            print("Mutation type: add_amino_acid")
-        elif randInt == 1:
-            child_peptide_list = Mutations.delete_amino_acid(child_peptide_list)
-            print("Mutation type: delete_amino_acid")
-        elif randInt == 2:
-            child_peptide_list = Mutations.swap_amino_acids(child_peptide_list)
-            print("Mutation type: swap_amino_acids")
-        elif randInt == 3:
-            child_peptide_list = Mutations.exchange_amino_acid(child_peptide_list)
-            print("Mutation type: exchange_amino_acid")
+            for index, replacement in zip(duplicates, replacements):
+                offspring[index] = replacement
 
-        return child_peptide_list
+            duplicates = duplicate_indices()
 
+        return offspring
 
-    def next_generation(self, non_dominated_sorted_population):
+
+    def next_generation(self, population):
         """Select individuals for the next generation.
 
         Use self.population_size.
 
         Parameters
         ----------
-        non_dominated_sorted_population : List of lists of self.Peptide objects.
-            E.g., [[Peptide#1, Peptide#2, ...], ...]
+        population : Population
+            Population object ranked by rank_population and
+            calculate_crowding_distances.
 
         Returns
         -------
-        List of self.Peptide objects.
-            E.g., [Peptide#1, Peptide#2, ...]
+        Population object.
         """
 
-        next_generation = []
-
-        for pareto_front in non_dominated_sorted_population:
-            if len(pareto_front) + len(next_generation) <= self.population_size:
-                # If the whole pareto front fits into next generation, add it.
-                next_generation.extend(pareto_front)
-            elif self.population_size - len(next_generation) > 0:
-                # Otherwise, add the individuals with the highest crowding distance
-                # to preserve genetic diversity.
-                pareto_front.sort(key=lambda solution: solution.distance)
-                next_generation.extend(
-                    pareto_front[-(self.population_size-len(next_generation)):]
-                )
-                break
+        # Whole pareto fronts are taken while they fit, the rest of the last
+        # one is filled with the individuals with the highest crowding distance
+        # to preserve genetic diversity.
+        with self.instrumentation.timer('selection'):
+            selected = ParetoRanking.select_survivors(population.rank, population.distance, self.population_size)
 
-        return next_generation
+        return population.take(selected)
@@ -0,0 +1,244 @@
+import numpy as np
+from Constants import AMINO_ACIDS
+
+# Amino acids are stored as codes 1..20 in a uint8 matrix, 0 is padding.
+CODE_TO_BYTE = np.frombuffer(b'\0' + ''.join(AMINO_ACIDS).encode(), dtype=np.uint8)
+BYTE_TO_CODE = np.zeros(256, dtype=np.uint8)
+BYTE_TO_CODE[CODE_TO_BYTE[1:]] = np.arange(1, len(AMINO_ACIDS) + 1)
+
+
+def encode_sequences(peptide_strings, width=None):
+    """Encode peptide strings into a padded matrix of amino acid codes.
+
+    Parameters
+    ----------
+    peptide_strings : list
+        List of peptide strings.
+    width : int
+        Number of columns of the matrix. Defaults to the longest peptide.
+
+    Returns
+    -------
+    Tuple (sequences, lengths).
+        sequences is a uint8 matrix of shape (n, width), lengths the peptide lengths.
+
+    Raises
+    ------
+    ValueError
+        If a peptide contains a letter outside AMINO_ACIDS.
+    """
+    peptide_strings = list(peptide_strings)
+    lengths = np.array([len(peptide_string) for peptide_string in peptide_strings], dtype=np.int64)
+
+    if width is None:
+        width = int(lengths.max()) if len(lengths) else 0
+
+    buffer = np.frombuffer(''.join(peptide_string.ljust(width, '\0') for peptide_string in peptide_strings).encode(),
+                           dtype=np.uint8)
+    codes = BYTE_TO_CODE[buffer]
+
+    # Code 0 is padding, so an unknown letter would silently shorten the peptide.
+    unknown = (codes == 0) & (buffer != 0)
+    if unknown.any():
+        row = int(np.flatnonzero(unknown)[0]) // width
+        raise ValueError('Peptide {!r} contains letters outside AMINO_ACIDS'.format(peptide_strings[row]))
+
+    sequences = codes.reshape(len(peptide_strings), width)
+
+    return sequences, lengths
+
+
+def decode_sequences(sequences):
+    """Decode a padded matrix of amino acid codes back into peptide strings."""
+    n, width = sequences.shape
+
+    if width == 0:
+        return [''] * n
+
+    # Padding decodes to NUL bytes, which the fixed-width bytes dtype drops.
+    characters = np.ascontiguousarray(CODE_TO_BYTE[sequences])
+    return characters.view('S{}'.format(width)).ravel().astype(str).tolist()
+
+
+class Population:
+    """Structure-of-arrays container for a population of peptides.
+
+    Sequences are stored in a padded uint8 matrix of amino acid codes
+    (see encode_sequences), every other property of the solutions is a
+    NumPy column indexed by the same row.
+    """
+
+    def __init__(self, sequences, lengths, ff_amp_probability, ff_toxicity, rank=None, distance=None):
+        """Store the columns.
+
+        Parameters
+        ----------
+        sequences : numpy.ndarray
+            uint8 matrix of shape (n, width) with amino acid codes, 0 is padding.
+        lengths : numpy.ndarray
+            Peptide lengths.
+        ff_amp_probability : numpy.ndarray
+            The possibility that antimicrobial peptides have antimicrobial properties.
+        ff_toxicity : numpy.ndarray
+            The SVM scores of toxicity of the peptides.
+        rank : numpy.ndarray
+            Pareto front indices, -1 if not ranked yet.
+        distance : numpy.ndarray
+            Crowding distances.
+        """
+        self.sequences = np.asarray(sequences, dtype=np.uint8)
+        self.lengths = np.asarray(lengths, dtype=np.int64)
+        self.ff_amp_probability = np.asarray(ff_amp_probability, dtype=float)
+        self.ff_toxicity = np.asarray(ff_toxicity, dtype=float)
+        self.rank = np.full(len(self.lengths), -1, dtype=np.int64) if rank is None else np.asarray(rank, dtype=np.int64)
+        self.distance = np.zeros(len(self.lengths)) if distance is None else np.asarray(distance, dtype=float)
+
+    @classmethod
+    def from_strings(cls, peptide_strings, ff_amp_probability, ff_toxicity):
+        """Create a population from peptide strings and their fitness values."""
+        sequences, lengths = encode_sequences(peptide_strings)
+        return cls(sequences, lengths, ff_amp_probability, ff_toxicity)
+
+    @classmethod
+    def empty(cls, width=0):
+        return cls(np.zeros((0, width), dtype=np.uint8), [], [], [])
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def __getitem__(self, index):
+        return Peptide.view(self, index)
+
+    def __iter__(self):
+        return (Peptide.view(self, index) for index in range(len(self)))
+
+    def peptide_strings(self):
+        return decode_sequences(self.sequences)
+
+    def objectives(self):
+        """Return an (n, 2) array with ff_amp_probability and ff_toxicity columns."""
+        return np.column_stack((self.ff_amp_probability, self.ff_toxicity))
+
+    def reset(self):
+        """Reset rank and crowding distance of all solutions to initial values."""
+        self.rank[:] = -1
+        self.distance[:] = 0
+
+    def take(self, indices):
+        """Return a new population with the rows at the given indices."""
+        indices = np.asarray(indices, dtype=np.int64)
+        return Population(
+            self.sequences[indices],
+            self.lengths[indices],
+            self.ff_amp_probability[indices],
+            self.ff_toxicity[indices],
+            self.rank[indices],
+            self.distance[indices]
+        )
+
+    def concatenate(self, other):
+        """Return a new population with the rows of both populations."""
+        width = max(self.sequences.shape[1], other.sequences.shape[1])
+        return Population(
+            np.vstack((self._padded(width), other._padded(width))),
+            np.concatenate((self.lengths, other.lengths)),
+            np.concatenate((self.ff_amp_probability, other.ff_amp_probability)),
+            np.concatenate((self.ff_toxicity, other.ff_toxicity)),
+            np.concatenate((self.rank, other.rank)),
+            np.concatenate((self.distance, other.distance))
+        )
+
+    def _padded(self, width):
+        if self.sequences.shape[1] == width:
+            return self.sequences
+        padded = np.zeros((len(self), width), dtype=np.uint8)
+        padded[:, :self.sequences.shape[1]] = self.sequences
+        return padded
+
+
+# Class Peptide is used to conveniently access all info about a solution.
+class Peptide:
+    """View of a single row of a Population.
+
+    Attribute reads and writes go straight to the population columns.
+    """
+
+    __slots__ = ('population', 'index')
+
+    def __init__(self, peptide_list, peptide_string, ff_amp_probability, ff_toxicity):
+        """Store information about a single solution.
+
+        The solution gets its own single-row population.
+
+        Parameters
+        ----------
+        peptide_list : list
+            List of peptides aminoacids.
+            E.g. ['A','D','K','R','S','M','E','A','C'...]
+        peptide_string : string
+            Peptide label.
+        ff_amp_probability : float
+            The possibility that antimicrobial peptide have antimicrobial properties.
+        ff_toxicity : float
+            The SVM score of toxicity of the peptide.
+        """
+        self.population = Population.from_strings(
+            [peptide_string if peptide_string is not None else ''.join(peptide_list)],
+            [ff_amp_probability],
+            [ff_toxicity]
+        )
+        self.index = 0
+
+    @classmethod
+    def view(cls, population, index):
+        """Return a view of the row at index of population."""
+        peptide = cls.__new__(cls)
+        peptide.population = population
+        peptide.index = index
+        return peptide
+
+    @property
+    def peptide_string(self):
+        length = self.population.lengths[self.index]
+        return decode_sequences(self.population.sequences[self.index:self.index + 1, :length])[0]
+
+    @property
+    def peptide_list(self):
+        return list(self.peptide_string)
+
+    @property
+    def ff_amp_probability(self):
+        return float(self.population.ff_amp_probability[self.index])
+
+    @ff_amp_probability.setter
+    def ff_amp_probability(self, value):
+        self.population.ff_amp_probability[self.index] = value
+
+    @property
+    def ff_toxicity(self):
+        return float(self.population.ff_toxicity[self.index])
+
+    @ff_toxicity.setter
+    def ff_toxicity(self, value):
+        self.population.ff_toxicity[self.index] = value
+
+    @property
+    def rank(self):
+        return int(self.population.rank[self.index])
+
+    @rank.setter
+    def rank(self, value):
+        self.population.rank[self.index] = value
+
+    @property
+    def distance(self):
+        return float(self.population.distance[self.index])
+
+    @distance.setter
+    def distance(self, value):
+        self.population.distance[self.index] = value
+
+    def reset(self):
+        """Reset rank and crowding distance to initial values."""
+        self.rank = -1
+        self.distance = 0
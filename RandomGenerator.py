@@ -1,10 +1,25 @@
-import random
+import numpy as np
 from Constants import AMINO_ACIDS
 
-def generate_random_peptides(lowerRange, upperRange, numberOfRandomlyGeneratedPeptides):
-    peptides = []
-    for _ in range(numberOfRandomlyGeneratedPeptides):
-        length = random.randint(lowerRange, upperRange)
-        peptide_sequence = random.choices(AMINO_ACIDS, k=length)
-        peptides.append(peptide_sequence)
-    return peptides
\ No newline at end of file
+def generate_random_sequences(lowerRange, upperRange, numberOfRandomlyGeneratedPeptides, rng):
+    """Generate random peptides directly as a padded matrix of amino acid codes.
+
+    Parameters
+    ----------
+    lowerRange : int
+        Lower limit of sequence length.
+    upperRange : int
+        Upper limit of sequence length.
+    numberOfRandomlyGeneratedPeptides : int
+        Number of peptides.
+    rng : numpy.random.Generator
+        Source of randomness.
+
+    Returns
+    -------
+    Tuple (sequences, lengths), see Population.encode_sequences.
+    """
+    lengths = rng.integers(lowerRange, upperRange + 1, numberOfRandomlyGeneratedPeptides)
+    sequences = rng.integers(1, len(AMINO_ACIDS) + 1, (numberOfRandomlyGeneratedPeptides, upperRange), dtype=np.uint8)
+    sequences[np.arange(upperRange)[None, :] >= lengths[:, None]] = 0
+    return sequences, lengths
@@ -0,0 +1,137 @@
+from html.parser import HTMLParser
+
+
+class TableExtractor(HTMLParser):
+    """Streaming extractor of selected columns from a single HTML table.
+
+    The page is processed as a stream of tag events; only the text of the
+    wanted cells of the wanted table is collected and no document tree is
+    built. Everything after the end of the table is ignored.
+    """
+
+    def __init__(self, attribute, value, columns, skip_rows=0, tbody_only=False):
+        """Configure the extractor.
+
+        Parameters
+        ----------
+        attribute : string
+            Attribute identifying the table, e.g. 'id' or 'border'.
+        value : string
+            Value of the attribute, e.g. 'tableTwo' or '1'.
+        columns : tuple
+            Indices of the td cells to extract from every row.
+        skip_rows : int
+            Number of leading rows to ignore (header rows).
+        tbody_only : bool
+            Extract only rows inside tbody.
+        """
+        super().__init__()
+        self.attribute = attribute
+        self.value = value
+        self.columns = tuple(columns)
+        self.skip_rows = skip_rows
+        self.tbody_only = tbody_only
+
+        self.rows = []
+        self.found = False
+
+        self._depth = 0
+        self._done = False
+        self._in_tbody = False
+        self._row_count = 0
+        self._cells = None
+        self._text = None
+
+    def handle_starttag(self, tag, attrs):
+        if self._done:
+            return
+
+        if tag == 'table':
+            if self._depth:
+                self._depth += 1
+            elif (self.attribute, self.value) in attrs:
+                self.found = True
+                self._depth = 1
+        elif self._depth != 1:
+            return
+        elif tag == 'tbody':
+            self._in_tbody = True
+        elif tag == 'tr':
+            self._cells = []
+        elif tag == 'td' and self._cells is not None:
+            self._text = []
+
+    def handle_endtag(self, tag):
+        if not self._depth or self._done:
+            return
+
+        if tag == 'table':
+            self._depth -= 1
+            self._done = self._depth == 0
+        elif self._depth != 1:
+            return
+        elif tag == 'tbody':
+            self._in_tbody = False
+        elif tag == 'td' and self._text is not None:
+            self._cells.append(''.join(self._text))
+            self._text = None
+        elif tag == 'tr' and self._cells is not None:
+            self._end_row()
+
+    def handle_data(self, data):
+        if self._text is not None:
+            self._text.append(data)
+
+    def _end_row(self):
+        cells, self._cells = self._cells, None
+
+        if self.tbody_only and not self._in_tbody:
+            return
+
+        self._row_count += 1
+        if self._row_count > self.skip_rows:
+            self.rows.append(tuple(cells[column] for column in self.columns))
+
+
+class MetaRefreshParser(HTMLParser):
+    """Find the target URL of a <meta http-equiv="refresh"> tag."""
+
+    def __init__(self):
+        super().__init__()
+        self.url = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if self.url is None and tag == 'meta' and attrs.get('http-equiv', '').lower() == 'refresh':
+            self.url = attrs.get('content', '').split('url=')[1]
+
+
+def extract_table(html, attribute, value, columns, skip_rows=0, tbody_only=False):
+    """Extract columns of a table from an HTML page.
+
+    Returns
+    -------
+    List of tuples with the text of the requested cells, or None if the table is missing.
+    """
+    extractor = TableExtractor(attribute, value, columns, skip_rows, tbody_only)
+    extractor.feed(html)
+    extractor.close()
+    return extractor.rows if extractor.found else None
+
+
+def camp_rows(html):
+    """Return (peptide_id, ff_amp_probability) text tuples of a CAMP result page."""
+    return extract_table(html, 'border', '1', (0, 2), skip_rows=1)
+
+
+def toxinpred_rows(html):
+    """Return (peptide_id, svm_score, prediction) text tuples of a ToxinPred result page."""
+    return extract_table(html, 'id', 'tableTwo', (0, 2, 3), tbody_only=True)
+
+
+def meta_refresh_url(html):
+    """Return the (relative) URL of the meta refresh tag of a page, or None."""
+    parser = MetaRefreshParser()
+    parser.feed(html)
+    parser.close()
+    return parser.url
@@ -0,0 +1,107 @@
+import time
+
+
+class StoppingCriterion:
+    """Policy which ends an NSGA_II run before num_generations.
+
+    NSGA_II calls start once before the first generation and should_stop
+    after every generation (or steady-state merge), once the generation's
+    hypervolume has been recorded.
+    """
+
+    def start(self, nsga):
+        """Reset the state of the criterion at the start of a run."""
+
+    def should_stop(self, nsga, population):
+        """Decide whether the run should stop.
+
+        Parameters
+        ----------
+        nsga : NSGA_II
+            The running algorithm.
+        population : Population
+            Ranked population after the last generation.
+
+        Returns
+        -------
+        A string with the reason to stop, or None to continue.
+        """
+        raise NotImplementedError
+
+
+class HypervolumeStagnation(StoppingCriterion):
+    """Stop when the archive hypervolume improved by less than epsilon for patience generations."""
+
+    def __init__(self, epsilon=1e-3, patience=5):
+        self.epsilon = epsilon
+        self.patience = patience
+
+    def should_stop(self, nsga, population):
+        history = [hypervolume for _, hypervolume in nsga.hypervolume_history]
+
+        if len(history) <= self.patience:
+            return None
+
+        improvement = history[-1] - history[-1 - self.patience]
+        if improvement < self.epsilon:
+            return 'hypervolume improved by {:.2g} in the last {} generations'.format(improvement, self.patience)
+
+        return None
+
+
+class FrontStability(StoppingCriterion):
+    """Stop when at least `threshold` of the rank 0 peptides stayed the same for patience generations."""
+
+    def __init__(self, threshold=0.9, patience=3):
+        self.threshold = threshold
+        self.patience = patience
+
+    def start(self, nsga):
+        self._previous_front = set()
+        self._stable_generations = 0
+
+    def should_stop(self, nsga, population):
+        peptide_strings = population.peptide_strings()
+        front = {peptide_strings[index] for index in range(len(population)) if population.rank[index] == 0}
+
+        unchanged = len(front & self._previous_front) / len(front) if front else 0.0
+        self._stable_generations = self._stable_generations + 1 if unchanged >= self.threshold else 0
+        self._previous_front = front
+
+        if self._stable_generations >= self.patience:
+            return '{:.0%} of the first front unchanged for {} generations'.format(unchanged, self.patience)
+
+        return None
+
+
+class EvaluationBudget(StoppingCriterion):
+    """Stop once max_evaluations peptides were submitted to the remote predictors."""
+
+    def __init__(self, max_evaluations):
+        self.max_evaluations = max_evaluations
+
+    def should_stop(self, nsga, population):
+        submitted = nsga.evaluation_counts['submitted']
+
+        if submitted >= self.max_evaluations:
+            return '{} of {} remote evaluations used'.format(submitted, self.max_evaluations)
+
+        return None
+
+
+class TimeBudget(StoppingCriterion):
+    """Stop once the run took longer than `seconds`."""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def start(self, nsga):
+        self._start = time.perf_counter()
+
+    def should_stop(self, nsga, population):
+        elapsed = time.perf_counter() - self._start
+
+        if elapsed >= self.seconds:
+            return 'ran for {:.1f} of {:.1f} seconds'.format(elapsed, self.seconds)
+
+        return None
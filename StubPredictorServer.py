@@ -0,0 +1,265 @@
+import argparse
+import email
+import hashlib
+import itertools
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+CAMP_PATH = '/predict/hii.php'
+TOXINPRED_PATH = '/raghava/toxinpred/multiple_test.php'
+TOXINPRED_RESULT_PATH = '/raghava/toxinpred/result.php'
+
+
+def _stub_noise(salt, peptide_string):
+    # Deterministic pseudo-random value in [-0.5, 0.5].
+    digest = hashlib.sha1((salt + ':' + peptide_string).encode()).digest()
+    return digest[0] / 255 - 0.5
+
+
+def _stub_properties(peptide_string):
+    charge = sum(peptide_string.count(amino_acid) for amino_acid in 'KR') - \
+        sum(peptide_string.count(amino_acid) for amino_acid in 'DE')
+    hydrophobic = sum(peptide_string.count(amino_acid) for amino_acid in 'AILMFVW')
+    return charge, hydrophobic, peptide_string.count('C')
+
+
+def stub_amp_probability(peptide_string):
+    """Deterministic stand-in for the CAMP AMP probability of a peptide.
+
+    Like real antimicrobial peptides, cationic and hydrophobic sequences score higher.
+    """
+    charge, hydrophobic, _ = _stub_properties(peptide_string)
+    logit = 0.6 * charge + 0.25 * hydrophobic - 2.0 + _stub_noise('camp', peptide_string)
+    return round(1 / (1 + math.exp(-logit)), 3)
+
+
+def stub_svm_score(peptide_string):
+    """Deterministic stand-in for the ToxinPred SVM score of a peptide.
+
+    Cysteine-rich, cationic and hydrophobic sequences score as more toxic,
+    which makes toxicity conflict with the AMP probability.
+    """
+    charge, hydrophobic, cysteines = _stub_properties(peptide_string)
+    value = 0.15 * charge + 0.4 * cysteines + 0.08 * hydrophobic - 0.8 + 0.5 * _stub_noise('toxinpred', peptide_string)
+    return round(1.5 * math.tanh(value), 2)
+
+
+def parse_fasta(text):
+    """Parse FASTA text into a list of (peptide_id, sequence) tuples."""
+    records = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('>'):
+            records.append([line[1:], ''])
+        elif records:
+            records[-1][1] += line
+    return [(peptide_id, sequence) for peptide_id, sequence in records]
+
+
+def render_camp_page(records):
+    """Render a CAMP-shaped result page for the given (peptide_id, sequence) records."""
+    rows = ''.join(
+        '<tr><td>{}</td><td>{}</td><td>{}</td></tr>'.format(
+            peptide_id,
+            'AMP' if stub_amp_probability(sequence) >= 0.5 else 'NAMP',
+            stub_amp_probability(sequence))
+        for peptide_id, sequence in records
+    )
+    return ('<html><body><table border="1">'
+            '<tr><th>Seq. ID.</th><th>Class</th><th>AMP Probability</th></tr>'
+            '{}</table></body></html>').format(rows)
+
+
+def render_toxinpred_page(records):
+    """Render a ToxinPred-shaped result page for the given (peptide_id, sequence) records."""
+    rows = ''.join(
+        '<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td></tr>'.format(
+            peptide_id,
+            sequence,
+            stub_svm_score(sequence),
+            'Toxin' if stub_svm_score(sequence) > 0 else 'Non-Toxin')
+        for peptide_id, sequence in records
+    )
+    return ('<html><body><table id="tableTwo"><thead>'
+            '<tr><th>Peptide ID</th><th>Peptide Sequence</th><th>SVM Score</th><th>Prediction</th></tr>'
+            '</thead><tbody>{}</tbody></table></body></html>').format(rows)
+
+
+class StubPredictorServer:
+    """Local HTTP server imitating the CAMP and ToxinPred web services.
+
+    Scores are deterministic functions of the peptide sequence, so runs
+    against the stub are reproducible and need no internet access. Latency
+    and a rate of failed (HTTP 503) responses can be configured to load-test
+    the evaluation pipeline.
+
+    Usage
+    -----
+    with StubPredictorServer(latency=0.2) as server:
+        FitnessFunctionScraper.scrape_fitness_function(['KLAKLAK'], url=server.camp_url)
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, error_rate=0.0, seed=0):
+        """Configure the server.
+
+        Parameters
+        ----------
+        host : string
+            Interface to listen on.
+        port : int
+            Port to listen on, 0 picks a free one.
+        latency : float
+            Seconds every response is delayed by.
+        error_rate : float
+            Probability that a request fails with HTTP 503.
+        seed : int
+            Seed of the random number generator deciding which requests fail.
+        """
+        self.latency = latency
+        self.error_rate = error_rate
+        self.request_count = 0
+        self.error_count = 0
+
+        self._random = random.Random(seed)
+
+        self._results = {}
+        self._result_ids = itertools.count()
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    @property
+    def camp_url(self):
+        return self.base_url + CAMP_PATH
+
+    @property
+    def toxinpred_url(self):
+        return self.base_url + TOXINPRED_PATH
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                failed = server._count_request()
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                path = urlsplit(self.path).path
+
+                if failed:
+                    self._reply('Service unavailable', status=503)
+                elif path == CAMP_PATH:
+                    records = parse_fasta(server._multipart_file(self.headers['Content-Type'], body))
+                    self._reply(render_camp_page(records))
+                elif path == TOXINPRED_PATH:
+                    form = parse_qs(body.decode())
+                    records = parse_fasta(form.get('seq', [''])[0])
+                    with server._lock:
+                        result_id = next(server._result_ids)
+                        server._results[result_id] = records
+                    self._reply('<html><head><meta http-equiv="refresh" content="0; url=result.php?id={}">'
+                                '</head></html>'.format(result_id))
+                else:
+                    self._reply('Not found', status=404)
+
+            def do_GET(self):
+                failed = server._count_request()
+                url = urlsplit(self.path)
+                query = parse_qs(url.query)
+
+                if failed:
+                    self._reply('Service unavailable', status=503)
+                    return
+
+                if url.path == TOXINPRED_RESULT_PATH and 'id' in query:
+                    with server._lock:
+                        records = server._results.pop(int(query['id'][0]), None)
+                    if records is not None:
+                        self._reply(render_toxinpred_page(records))
+                        return
+
+                self._reply('Not found', status=404)
+
+            def _reply(self, text, status=200):
+                if server.latency:
+                    time.sleep(server.latency)
+                content = text.encode()
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'text/html; charset=utf-8')
+                    self.send_header('Content-Length', str(len(content)))
+                    self.end_headers()
+                    self.wfile.write(content)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client gave up waiting (e.g. a read timeout).
+                    pass
+
+        return Handler
+
+    def _count_request(self):
+        # Count the request and decide whether it fails.
+        with self._lock:
+            self.request_count += 1
+            failed = self.error_rate > 0 and self._random.random() < self.error_rate
+            self.error_count += failed
+            return failed
+
+    @staticmethod
+    def _multipart_file(content_type, body):
+        # Pull the uploaded FASTA file out of a multipart/form-data body.
+        message = email.message_from_bytes(
+            'Content-Type: {}\r\n\r\n'.format(content_type).encode() + body
+        )
+        for part in message.walk():
+            if part.get_filename() is not None:
+                return part.get_payload(decode=True).decode()
+        return ''
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve CAMP- and ToxinPred-shaped pages locally.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds every response is delayed by.')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Probability that a request fails.')
+    parser.add_argument('--seed', type=int, default=0)
+    arguments = parser.parse_args()
+
+    server = StubPredictorServer(arguments.host, arguments.port, arguments.latency, arguments.error_rate, arguments.seed)
+    print('CAMP:      {}'.format(server.camp_url))
+    print('ToxinPred: {}'.format(server.toxinpred_url))
+
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,173 @@
+import ast
+
+import numpy as np
+
+import FitnessFunctionScraper
+import ParetoRanking
+from Constants import AMINO_ACIDS
+from Population import encode_sequences
+
+# Kyte-Doolittle hydrophobicity of every amino acid, in AMINO_ACIDS order.
+HYDROPHOBICITY = np.array([
+    1.8, 2.5, -3.5, -3.5, 2.8, -0.4, -3.2, 4.5, -3.9, 3.8,
+    1.9, -3.5, -1.6, -3.5, -4.5, -0.8, -0.7, 4.2, -0.9, -1.3
+])
+
+# Charge of every amino acid at neutral pH, in AMINO_ACIDS order.
+CHARGE = np.array([1.0 if amino_acid in 'KR' else -1.0 if amino_acid in 'DE' else 0.1 if amino_acid == 'H' else 0.0
+                   for amino_acid in AMINO_ACIDS])
+
+
+def sequence_features(sequences, lengths):
+    """Compute a feature vector for every encoded peptide.
+
+    Features are the amino acid composition (20), normalized dipeptide
+    counts (400), length, net charge and mean hydrophobicity.
+
+    Parameters
+    ----------
+    sequences : numpy.ndarray
+        Padded uint8 matrix of amino acid codes (see Population.encode_sequences).
+    lengths : numpy.ndarray
+        Peptide lengths.
+
+    Returns
+    -------
+    numpy.ndarray of shape (n, 423).
+    """
+    n, width = sequences.shape
+    num_amino_acids = len(AMINO_ACIDS)
+    rows = np.repeat(np.arange(n), width)
+    safe_lengths = np.maximum(lengths, 1)
+
+    counts = np.bincount(
+        rows * (num_amino_acids + 1) + sequences.ravel(),
+        minlength=n * (num_amino_acids + 1)
+    ).reshape(n, num_amino_acids + 1)[:, 1:].astype(float)
+
+    first, second = sequences[:, :-1].astype(np.int64), sequences[:, 1:].astype(np.int64)
+    valid = (first > 0) & (second > 0)
+    pair_rows = np.repeat(np.arange(n), max(width - 1, 0)).reshape(n, -1)
+    dipeptides = np.bincount(
+        (pair_rows * num_amino_acids ** 2 + (first - 1) * num_amino_acids + (second - 1))[valid],
+        minlength=n * num_amino_acids ** 2
+    ).reshape(n, num_amino_acids ** 2) / np.maximum(lengths - 1, 1)[:, None]
+
+    return np.column_stack((
+        counts / safe_lengths[:, None],
+        dipeptides,
+        lengths,
+        counts @ CHARGE,
+        counts @ HYDROPHOBICITY / safe_lengths,
+    ))
+
+
+def load_legacy_results(path):
+    """Read a results file with one (peptide_list, peptide_string, ff_amp_probability, ff_toxicity) tuple per line.
+
+    Returns
+    -------
+    List of (peptide_string, ff_amp_probability, ff_toxicity) tuples.
+    """
+    results = []
+    with open(path, 'r') as file:
+        for line in file:
+            if line.strip():
+                _, peptide_string, ff_amp_probability, ff_toxicity = ast.literal_eval(line.strip())
+                results.append((peptide_string, float(ff_amp_probability), float(ff_toxicity)))
+    return results
+
+
+class SurrogateModel:
+    """Ridge regression of both fitness functions on sequence features.
+
+    The model learns from peptides already scored by the remote predictors
+    and predicts ff_amp_probability and ff_toxicity of new candidates, so
+    only the most promising ones need to be sent to the web services.
+    """
+
+    def __init__(self, regularization=100.0, min_training_size=50):
+        """Create an untrained model.
+
+        Parameters
+        ----------
+        regularization : float
+            Ridge penalty on the standardized feature weights.
+        min_training_size : int
+            Number of distinct training peptides needed before the model is used.
+        """
+        self.regularization = regularization
+        self.min_training_size = min_training_size
+
+        self._training_data = {}
+        self._weights = None
+        self._feature_mean = None
+        self._feature_scale = None
+        self._target_mean = None
+
+    @classmethod
+    def from_cache(cls, fitness_cache, **kwargs):
+        """Create a model trained on all peptides scored by both predictors in a FitnessCache."""
+        model = cls(**kwargs)
+        amp_probabilities = dict(fitness_cache.items(FitnessFunctionScraper.camp_predictor_key()))
+        toxicities = dict(fitness_cache.items(FitnessFunctionScraper.toxinpred_predictor_key()))
+
+        model.add_training_data([
+            (peptide_string, amp_probabilities[peptide_string], toxicities[peptide_string][0])
+            for peptide_string in amp_probabilities if peptide_string in toxicities
+        ])
+        return model
+
+    @property
+    def ready(self):
+        return len(self._training_data) >= self.min_training_size
+
+    def add_training_data(self, results):
+        """Add scored peptides and refit the model.
+
+        Parameters
+        ----------
+        results : list
+            List of (peptide_string, ff_amp_probability, ff_toxicity) tuples.
+        """
+        for peptide_string, ff_amp_probability, ff_toxicity in results:
+            self._training_data[peptide_string] = (ff_amp_probability, ff_toxicity)
+
+        if self.ready:
+            self.fit()
+
+    def fit(self):
+        peptide_strings = list(self._training_data)
+        features = sequence_features(*encode_sequences(peptide_strings))
+        targets = np.array([self._training_data[peptide_string] for peptide_string in peptide_strings])
+
+        self._feature_mean = features.mean(axis=0)
+        self._feature_scale = features.std(axis=0)
+        self._feature_scale[self._feature_scale == 0] = 1
+        self._target_mean = targets.mean(axis=0)
+
+        standardized = (features - self._feature_mean) / self._feature_scale
+        self._weights = np.linalg.solve(
+            standardized.T @ standardized + self.regularization * np.eye(standardized.shape[1]),
+            standardized.T @ (targets - self._target_mean)
+        )
+
+    def predict(self, sequences, lengths):
+        """Predict (ff_amp_probability, ff_toxicity) for encoded peptides.
+
+        Returns
+        -------
+        numpy.ndarray of shape (n, 2).
+        """
+        standardized = (sequence_features(sequences, lengths) - self._feature_mean) / self._feature_scale
+        return standardized @ self._weights + self._target_mean
+
+    def select_promising(self, sequences, lengths, count):
+        """Return indices of the `count` candidates with the best predicted pareto rank.
+
+        Ties within the last admitted front are broken by predicted crowding distance.
+        """
+        predictions = self.predict(sequences, lengths)
+        _, ranks = ParetoRanking.non_dominated_sort(predictions)
+        distances = ParetoRanking.crowding_distances(predictions, ranks)
+        return ParetoRanking.select_survivors(ranks, distances, count)
@@ -1,10 +1,28 @@
-from PeptideEvolutionNSGAII import NSGA_II
-import matplotlib.pyplot as plt
-from matplotlib.ticker import MaxNLocator
-import numpy as np
-import os
+#!/usr/bin/env python3
 
-def visualize_pareto_fronts(pareto_fronts):
+import argparse
+
+# Only argparse is imported at module load, so `main.py --help` and short
+# batch jobs do not pay for NumPy, requests or matplotlib before they need them.
+
+
+def visualize_pareto_fronts(pareto_fronts, output_path=None):
+    """Plot the pareto fronts.
+
+    Parameters
+    ----------
+    pareto_fronts : list
+        Pareto fronts returned by NSGA_II.calculate.
+    output_path : string
+        If set, the figure is saved to this path instead of being shown.
+    """
+    import matplotlib
+    if output_path is not None:
+        # Render without a display, e.g. on batch workers.
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from matplotlib.ticker import MaxNLocator
+    import numpy as np
 
     ax = plt.figure().gca()
     ax.xaxis.set_major_locator(MaxNLocator(integer=True))
@@ -22,58 +40,97 @@ def visualize_pareto_fronts(pareto_fronts):
             _, _, ff_amp_probability, ff_toxicity = peptide
             plt.scatter(ff_toxicity, ff_amp_probability, c=colors[front_index])
 
-    plt.show()
-
-from scipy import integrate
-
-def calculate_hyperarea(pareto_front):
-    # Sort the points by x value
-    sorted_points = sorted(pareto_front, key=lambda x: x[2])
-    
-    # Separate the x and y values
-    x_values = [point[2] for point in sorted_points]
-    y_values = [point[3] for point in sorted_points]
-    
-    # Add the origin to the points
-    x_values = [0] + x_values
-    y_values = [0] + y_values
-    
-    # Calculate the hyperarea using the trapezoidal rule
-    hyperarea = np.trapz(y_values, x_values)
-    
-    return hyperarea
-
-if os.path.exists('in.txt'):
-    os.remove('in.txt')
-if os.path.exists('front.txt'):
-    os.remove('front.txt')
-
-GA = NSGA_II(
-    lowerRange=8,
-    upperRange=19,
-    population_size=70,
-    offspring_size=20,
-    num_generations=30,
-    num_solutions_tournament=5,
-    mutation_probability=0.3,
-    penalty_function_reducer=0.7
-)
-
-pareto_fronts = GA.calculate()
-
-visualize_pareto_fronts(pareto_fronts)
-hyperarea = calculate_hyperarea(pareto_fronts[0])
-
-# Get the zeroth Pareto front
-zero_pareto_front = pareto_fronts[0]
-
-# Write the sequences to front.txt in FASTA format
-with open('front.txt', 'w') as file:
-    for solution in zero_pareto_front:
-        peptide_string = solution.peptide_string
-        file.write(f'>{peptide_string}\n{peptide_string}\n')
-
-print(f"Hyperarea for current parameters: {hyperarea}")
-
-for solution in pareto_fronts[0]:
-    print(solution)
\ No newline at end of file
+    if output_path is not None:
+        plt.savefig(output_path)
+    else:
+        plt.show()
+
+
+def write_front_fasta(front, path):
+    """Write the peptides of a pareto front to path in FASTA format."""
+    with open(path, 'w') as file:
+        for _, peptide_string, _, _ in front:
+            file.write(f'>{peptide_string}\n{peptide_string}\n')
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description='Evolve antimicrobial peptides with NSGA-II.')
+    parser.add_argument('--lower-range', type=int, default=8, help='Minimum peptide length.')
+    parser.add_argument('--upper-range', type=int, default=19, help='Maximum peptide length.')
+    parser.add_argument('--population-size', type=int, default=70)
+    parser.add_argument('--offspring-size', type=int, default=20)
+    parser.add_argument('--generations', type=int, default=30)
+    parser.add_argument('--num-solutions-tournament', type=int, default=5)
+    parser.add_argument('--mutation-probability', type=float, default=0.3)
+    parser.add_argument('--penalty-function-reducer', type=float, default=0.7)
+    parser.add_argument('--seed', type=int, help='Seed of the random number generator.')
+    parser.add_argument('--cache', default='fitness_cache.db', help='Path of the SQLite fitness cache.')
+    parser.add_argument('--checkpoint', help='Path of the checkpoint written after every generation.')
+    parser.add_argument('--resume', action='store_true', help='Continue the run saved in --checkpoint.')
+    parser.add_argument('--evaluation-archive', help='Directory of an EvaluationArchive recording every evaluation.')
+    parser.add_argument('--run-id', type=int, default=0, help='Run id in the evaluation archive.')
+    parser.add_argument('--metrics', help='JSON lines file receiving per-generation metrics.')
+    parser.add_argument('--front-output', default='front.txt', help='FASTA file receiving the final front.')
+    parser.add_argument('--headless', action='store_true', help='Do not plot the pareto fronts.')
+    parser.add_argument('--plot-output', help='Save the plot to this file instead of showing it.')
+    parser.add_argument('--camp-url', help='Defaults to FitnessFunctionScraper.CAMP_URL.')
+    parser.add_argument('--toxinpred-url', help='Defaults to FitnessFunctionScraper.TOXINPRED_URL.')
+    arguments = parser.parse_args(argv)
+
+    if arguments.resume and arguments.checkpoint is None:
+        parser.error('--resume requires --checkpoint')
+
+    return arguments
+
+
+def main(argv=None):
+    arguments = parse_arguments(argv)
+
+    import FitnessFunctionScraper
+    from EvaluationArchive import EvaluationArchive
+    from EvaluationEngine import EvaluationEngine
+    from FitnessCache import FitnessCache
+    from Hypervolume import hypervolume
+    from Instrumentation import Instrumentation
+    from PeptideEvolutionNSGAII import NSGA_II
+
+    GA = NSGA_II(
+        lowerRange=arguments.lower_range,
+        upperRange=arguments.upper_range,
+        population_size=arguments.population_size,
+        offspring_size=arguments.offspring_size,
+        num_generations=arguments.generations,
+        num_solutions_tournament=arguments.num_solutions_tournament,
+        mutation_probability=arguments.mutation_probability,
+        penalty_function_reducer=arguments.penalty_function_reducer,
+        fitness_cache=FitnessCache(arguments.cache),
+        evaluator=EvaluationEngine(
+            camp_url=arguments.camp_url or FitnessFunctionScraper.CAMP_URL,
+            toxinpred_url=arguments.toxinpred_url or FitnessFunctionScraper.TOXINPRED_URL
+        ),
+        seed=arguments.seed,
+        checkpoint_path=arguments.checkpoint,
+        instrumentation=Instrumentation(sink_path=arguments.metrics),
+        evaluation_archive=EvaluationArchive(arguments.evaluation_archive) if arguments.evaluation_archive else None,
+        run_id=arguments.run_id
+    )
+
+    pareto_fronts = GA.resume() if arguments.resume else GA.calculate()
+
+    if not arguments.headless or arguments.plot_output:
+        visualize_pareto_fronts(pareto_fronts, arguments.plot_output)
+
+    front_hypervolume = hypervolume([(ff_amp_probability, ff_toxicity) for _, _, ff_amp_probability, ff_toxicity in pareto_fronts[0]])
+
+    # Write the sequences of the zeroth Pareto front in FASTA format
+    write_front_fasta(pareto_fronts[0], arguments.front_output)
+
+    print(f"Hypervolume of the final front: {front_hypervolume}")
+    print(f"Hypervolume of the Pareto archive: {GA.pareto_archive.hypervolume}")
+
+    for solution in pareto_fronts[0]:
+        print(solution)
+
+
+if __name__ == '__main__':
+    main()